@@ -6,6 +6,7 @@ import tkinter as tk
 from tkinter import messagebox, colorchooser
 from typing import Callable
 import Setting
+import FrameClock
 import GameEngine
 
 class Application(tk.Frame):
@@ -13,7 +14,8 @@ class Application(tk.Frame):
         super().__init__(master)
         self.master: tk.Tk = master
         self.title = title
-        self.aff = None
+        self.clock = FrameClock.get_clock(master)
+        self.timer_task: FrameClock.Task = None
         self.time = (0, 0)
 
         self.master.protocol("WM_DELETE_WINDOW", lambda:self.delete_window())
@@ -87,6 +89,7 @@ class Application(tk.Frame):
         self.game_engine.update()
 
     def setting_close(self):
+        Setting.container.setting_update()
         self.master.geometry(Setting.data.get_geometry(False, "Field"))
         self.game_engine.update()
         if self.enemy_window.window_check():
@@ -123,6 +126,9 @@ class Application(tk.Frame):
             print("カードリストの枚数が不正です")
 
     def end(self):
+        if Setting.debug:
+            Setting.container.memory_report()
+            print(f"frame: {self.clock.frame_count}  overrun: {self.clock.overrun_count}")
         self._stop_timer()
         if self.enemy_window.window_check():
             self.enemy_window.game_engine.end()
@@ -130,15 +136,15 @@ class Application(tk.Frame):
 
     def _start_timer(self):
         print("start_timer")
-        if self.aff is not None:
-            self.after_cancel(self.aff)
+        if self.timer_task is not None:
+            self.clock.remove(self.timer_task)
         self.time = (0, 0)
-        self._timer()
+        self.timer_task = self.clock.add(self._timer, 1)
 
     def _stop_timer(self):
-        if self.aff is not None:
-            self.after_cancel(self.aff)
-        self.aff = None
+        if self.timer_task is not None:
+            self.clock.remove(self.timer_task)
+        self.timer_task = None
         self.master.title(self.title + " 選択デッキ: " + self.game_engine.card_list.name)
 
     def _timer(self):
@@ -146,7 +152,6 @@ class Application(tk.Frame):
         if self.time[1] == 60:
             self.time = (self.time[0]+1, 0)
         self.title_add(f"  Time: {self.time[0]}分: {self.time[1]}秒")
-        self.aff = self.after(1000, self._timer)
 
 
 class NewWindow:
@@ -509,5 +514,8 @@ class UserSettingWindow(NewWindow):
 
 def run(name, ver):
     win = tk.Tk()
+    Setting.startup_timer.mark("tk.Tk")
     app = Application(win, f"{name}_Version.{ver}")
+    Setting.startup_timer.mark("Application")
+    win.after_idle(Setting.startup_timer.report)
     app.mainloop()
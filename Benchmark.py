@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+性能計測用ファイル
+python Benchmark.py <計測名> で実行する
+"""
+
+import argparse
+import os
+import re
+import time
+from typing import Callable
+
+import Network
+import PageParser
+
+
+def measure(func: Callable, repeat: int) -> float:
+    """
+    funcをrepeat回実行した時の1回あたりの平均時間(秒)
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def print_result(label: str, before: float, after: float):
+    print(f"{label:<40}{before * 1000:10.3f} ms{after * 1000:10.3f} ms{before / after:8.1f} x")
+
+
+def record_pages(args):
+    """
+    デッキページとカード詳細ページをfixtureフォルダに保存する
+    """
+    transport = Network.FixtureTransport(args.fixture, record=Network.RequestsTransport())
+    client = Network.HttpClient(transport=transport)
+    for deck_id in args.deck_id:
+        r = client.get(f"/deck/result.html/deckID/{deck_id}/")
+        for card_id in dict.fromkeys(PageParser.parse_deck_ids(r.content)):
+            client.get(f"/card-search/details.php/card/{card_id}")
+            print(f"record {deck_id} {card_id}")
+
+
+def _soup_deck_ids(content: bytes) -> list[str]:
+    """
+    PageParser導入前のデッキページ解析
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content.decode("utf-8"), "html.parser")
+    card_list = []
+    for c in re.findall(r'"deck_.*" type="hidden" value="(.*)\d*">', str(soup)):
+        if c and isinstance(c, str):
+            for data in c.split("-"):
+                card_id, length, _ = map(str, data.split("_"))
+                for _ in range(int(length)):
+                    card_list.append(card_id)
+    return card_list
+
+def _soup_card_detail(content: bytes) -> tuple[str, str, str]:
+    """
+    PageParser導入前のカード詳細ページ解析
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content.decode("utf-8"), "html.parser")
+    name = re.findall(r'<h1 class="Heading1 mt20">(.*)</h1>', str(soup))[0]
+    category = re.findall(r'<h2 class="mt20">(.*)</h2>', str(soup))[0]
+    image_url = re.findall(r'class="fit" src="(.*)\d*"/>', str(soup))[0]
+    return (name, category, image_url)
+
+def _synthetic_pages(size: int) -> tuple[bytes, bytes]:
+    """
+    実際のページと同じ形のタグを含む、約size KBのデッキページとカード詳細ページを生成する
+    保存したページが無い環境でもparseの計測を再現できるようにする
+    """
+    filler = "".join(
+        f'<li class="List_item"><a href="/card-search/details.php/card/{index}">'
+        f'<img class="thumb" src="/assets/images/card_images/{index}.jpg" alt="カード{index}"/></a></li>\n'
+        for index in range(100)
+    )
+    body = filler * max(1, size * 1024 // len(filler.encode("utf-8")))
+    deck_inputs = "".join(
+        f'<input name="deck_{kind}" type="hidden" value="{value}"><span class="count"></span>\n'
+        for kind, value in [
+            ("pke", "40001_4_1-40002_3_1-40003_2_1-40004_1_1"),
+            ("gds", "40101_4_1-40102_4_1-40103_4_1-40104_2_1"),
+            ("tool", "40201_2_1"),
+            ("sup", "40301_4_1-40302_4_1-40303_3_1-40304_2_1"),
+            ("sta", "40401_3_1"),
+            ("ene", "40501_10_1-40502_4_1"),
+        ]
+    )
+    deck_page = f"<html><body><ul>{body}</ul><form>{deck_inputs}</form></body></html>"
+    card_page = (
+        f"<html><body><ul>{body}</ul>"
+        '<h1 class="Heading1 mt20">ピカチュウ</h1>'
+        '<img class="fit" src="/assets/images/card_images/large/40001.jpg"/>'
+        '<h2 class="mt20">ワザ</h2>'
+        "</body></html>"
+    )
+    return (deck_page.encode("utf-8"), card_page.encode("utf-8"))
+
+def bench_parse(args):
+    """
+    fixtureフォルダのページを旧方式(BeautifulSoup)とPageParserで解析する時間を比較する
+    fixtureフォルダが無い場合は生成したページで計測する
+    """
+    pages = {"deck": [], "card": []}
+    if os.path.isdir(args.fixture):
+        print(f"{args.fixture}フォルダの保存済みページで計測します")
+        for filename in sorted(os.listdir(args.fixture)):
+            with open(f"{args.fixture}/{filename}", "rb") as f:
+                content = f.read()
+            if "deckID" in filename:
+                pages["deck"].append(content)
+            elif "details.php" in filename:
+                pages["card"].append(content)
+    else:
+        print(f"{args.fixture}フォルダがありません (record-pagesで保存できます)")
+        print(f"生成した{args.size} KBのページで計測します")
+        deck_page, card_page = _synthetic_pages(args.size)
+        pages["deck"].append(deck_page)
+        pages["card"].append(card_page)
+    print(f"{'page':<40}{'before':>13}{'after':>13}{'speed':>10}")
+    for key, before_func, after_func in [
+        ("deck", _soup_deck_ids, PageParser.parse_deck_ids),
+        ("card", _soup_card_detail, PageParser.parse_card_detail),
+    ]:
+        if not pages[key]:
+            print(f"{key}: fixtureがありません")
+            continue
+        for page in pages[key]:
+            if before_func(page) != after_func(page):
+                print(f"{key}: 旧方式とPageParserの結果が一致しません")
+        before = sum(measure(lambda: before_func(page), args.repeat) for page in pages[key]) / len(pages[key])
+        after = sum(measure(lambda: after_func(page), args.repeat) for page in pages[key]) / len(pages[key])
+        print_result(f"{key} ({len(pages[key])} pages)", before, after)
+
+def bench_decode(args):
+    """
+    Cardフォルダのカード画像について、画質設定毎の展開+リサイズ時間を比較する
+    サイズは場のカードサイズとデッキ画像のサイズ(カードサイズの半分)
+    """
+    import Setting
+    Setting.data.setting_load("USER_SETTING")
+    paths = []
+    for card_id in sorted(os.listdir("Card")):
+        entry = Setting.catalog.get(card_id) if os.path.isdir(f"Card/{card_id}") else None
+        if entry is not None:
+            paths.append(entry["path"])
+        if len(paths) >= args.count:
+            break
+    Setting.catalog.save()
+    if not paths:
+        print("Cardフォルダにカード画像がありません")
+        return
+    container = Setting.container
+    width, height = Setting.data.get_card_size()
+    print(f"{len(paths)} cards")
+    print(f"{'size':<40}{'full':>13}{'draft':>13}{'speed':>10}")
+    for size in [(width, height), (width // 2, height // 2)]:
+        def full():
+            for path in paths:
+                container.create_card_image(path).resize(size, Setting.Image.BICUBIC)
+        before = measure(full, args.repeat) / len(paths)
+        for quality in Setting.IMAGE_QUALITY[1:]:
+            container.image_quality = quality
+            def draft():
+                for path in paths:
+                    container.create_card_image(path, size)
+            after = measure(draft, args.repeat) / len(paths)
+            print_result(f"{size[0]}x{size[1]} {quality}", before, after)
+    container.image_quality = Setting.data.image_quality
+
+
+class _DictCard:
+    """
+    __slots__導入前のCardと同じ属性の持ち方をするクラス
+    """
+    def __init__(self, index: int, card_id: str):
+        self.card_id = card_id
+        self.id = f"id_{str(index)}"
+        self.image_tk = None
+        self.check = False
+        self.doku = False
+        self.yakedo = False
+        self.bad_stat = ""
+        self.tail_flag = False
+        self.category = "ポケモン"
+        self.name = card_id
+        self.hp = 0
+        self.move = False
+
+    def _get_index(self):
+        return int(self.id.replace("id_", ""))
+
+    def __lt__(self, other):
+        return self._get_index() < other._get_index()
+
+def _create_slot_card(index: int, card_id: str):
+    """
+    画像を生成せずにCardを作る
+    """
+    import Object
+    card = object.__new__(Object.Card)
+    card.card_id = card_id
+    card.index = index
+    card.id = f"id_{str(index)}"
+    card._image_tk = None
+    card.flags = 0
+    card.bad_code = 0
+    card.category = "ポケモン"
+    card.name = card_id
+    card.hp = 0
+    card.move = False
+    return card
+
+def bench_card(args):
+    """
+    60枚のカードのメモリ使用量とソート、スナップショットの時間を比較する
+    """
+    import random
+    import sys
+    import Object
+    old_cards = [_DictCard(index, str(index % 20)) for index in range(60)]
+    new_cards = [_create_slot_card(index, str(index % 20)) for index in range(60)]
+    old_size = sum(sys.getsizeof(card) + sys.getsizeof(card.__dict__) for card in old_cards) / 60
+    new_size = sum(sys.getsizeof(card) for card in new_cards) / 60
+    print(f"{'':<40}{'before':>13}{'after':>13}{'speed':>10}")
+    print(f"{'memory / card':<40}{old_size:10.0f} B {new_size:10.0f} B{old_size / new_size:8.1f} x")
+    random.seed(0)
+    order = list(range(60))
+    random.shuffle(order)
+    old_list = [old_cards[i] for i in order]
+    new_list = [new_cards[i] for i in order]
+    print_result(
+        "sort 60 cards",
+        measure(lambda: sorted(old_list), args.repeat),
+        measure(lambda: sorted(new_list, key=Object.Card.sort_key), args.repeat)
+    )
+    print_result(
+        "snapshot 60 card states",
+        measure(lambda: [(c.hp, c.check, c.doku, c.yakedo, c.tail_flag, c.bad_stat) for c in old_list], args.repeat),
+        measure(lambda: [(c.hp, c.flags, c.bad_code) for c in new_list], args.repeat)
+    )
+
+
+class _Zone:
+    """
+    Canvasを持たないゾーン
+    """
+    def __init__(self, object_name: str):
+        self.object_name = object_name
+        self.list = []
+
+
+def _snapshot_add(data: list, zones: list[_Zone], field_data: list, title: str):
+    """
+    変更前のTurnManager.addと同じく全てのゾーンを毎回コピーする
+    差分の履歴と同じ情報を比較するため、全てのカードのステータスもコピーする
+    """
+    dic = {"title": title, "Field": field_data}
+    status = {card.id: card.get_status() for _, card in field_data}
+    for zone in zones:
+        dic[zone.object_name] = zone.list.copy()
+        status.update((card.id, card.get_status()) for card in zone.list)
+    dic["Status"] = status
+    data.append(dic)
+
+def _simulate_game(actions: int, seed: int=0):
+    """
+    ランダムにカードを移動する対戦を再現し、1手毎にゾーンとFieldの状態を返す
+    """
+    import random
+    random.seed(seed)
+    zones = [_Zone(name) for name in ("Deck", "Hand", "Temp", "Trash", "Side", "Lost")]
+    dic = {zone.object_name: zone for zone in zones}
+    cards = [_create_slot_card(index, str(index % 20)) for index in range(60)]
+    dic["Deck"].list = cards[:47]
+    dic["Hand"].list = cards[47:54]
+    dic["Side"].list = cards[54:]
+    field = {}
+    count = 0
+    while count < actions:
+        source = random.choice(["Field"] + [zone.object_name for zone in zones])
+        cards_in = list(field) if source == "Field" else dic[source].list
+        if not cards_in:
+            continue
+        card = random.choice(cards_in)
+        move_to = random.choice(["Field", "Field", "Hand", "Trash", "Deck"])
+        if source == "Field":
+            del field[card]
+        else:
+            cards_in.remove(card)
+        if move_to == "Field":
+            field[card] = (random.randrange(800), random.randrange(600))
+        else:
+            dic[move_to].list.append(card)
+        if field and random.random() < 0.3:
+            # 場のカードのHPやステータスの変更
+            changed = random.choice(list(field))
+            changed.hp = random.randrange(0, 300, 10)
+            changed.flags = random.randrange(16)
+        count += 1
+        yield zones, [(position, card) for card, position in field.items()], f"{source} -> {move_to}"
+
+def bench_history(args):
+    """
+    全ゾーンを毎回コピーする履歴と差分の履歴で、メモリ使用量とadd_turnの時間を比較する
+    """
+    import tracemalloc
+    import GameEngine
+
+    def run(add: Callable) -> tuple[float, int]:
+        elapsed = 0.0
+        tracemalloc.start()
+        for zones, field_data, title in _simulate_game(args.actions):
+            start = time.perf_counter()
+            add(zones, field_data, title)
+            elapsed += time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return elapsed / args.actions, size
+
+    import tkinter as tk
+    root = None
+    try:
+        root = tk.Tk()
+        canvas = tk.Canvas(root)
+        for index in range(60):
+            canvas.create_rectangle(index, index, index + 10, index + 10, tag=f"id_{index}")
+        bbox = canvas.bbox
+        label = f"add_turn x {args.actions}"
+    except tk.TclError:
+        # 画面が無い環境ではTclの呼び出し1回で代用する(実際のbboxより速いので変更前の時間は短めに出る)
+        tcl = tk.Tcl()
+        bbox = lambda tag: tcl.call("list", tag, 0, 0, 10, 10)
+        label = f"add_turn x {args.actions} (bbox代用)"
+
+    snapshots = []
+    def snapshot_add(zones, field_data, title):
+        # 変更前のMaster.add_turnはFieldのカード毎にbboxで座標を取得していた
+        for _, card in field_data:
+            bbox(card.id)
+        _snapshot_add(snapshots, zones, field_data, title)
+    old_time, old_size = run(snapshot_add)
+    manager = None
+    def delta_add(zones, field_data, title):
+        nonlocal manager
+        if manager is None:
+            manager = GameEngine.TurnManager(*zones, budget=args.budget * 1024)
+            manager.reset([], "Start")
+        manager.add(field_data, title)
+    new_time, new_size = run(delta_add)
+    print(f"{'':<40}{'before':>13}{'after':>13}{'speed':>10}")
+    print_result(label, old_time, new_time)
+    print(f"{'history memory':<40}{old_size / 1024:9.0f} KB{new_size / 1024:9.0f} KB{old_size / new_size:8.1f} x")
+    print(f"history entries: {len(snapshots)} -> {len(manager.entries)} (budget {args.budget} KB)")
+    if root is None:
+        print("Tkが使えないため、bboxはTclの呼び出し1回で代用しています")
+    else:
+        root.destroy()
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(required=True)
+
+    record_parser = subparsers.add_parser("record-pages", help="計測用のページを保存する")
+    record_parser.add_argument("deck_id", nargs="+")
+    record_parser.add_argument("--fixture", default="Fixture")
+    record_parser.set_defaults(func=record_pages)
+
+    parse_parser = subparsers.add_parser("parse", help="ページ解析の時間を計測する")
+    parse_parser.add_argument("--fixture", default="Fixture")
+    parse_parser.add_argument("--repeat", type=int, default=20)
+    parse_parser.add_argument("--size", type=int, default=400, help="生成するページのサイズ(KB)")
+    parse_parser.set_defaults(func=bench_parse)
+
+    decode_parser = subparsers.add_parser("decode", help="カード画像の展開とリサイズの時間を計測する")
+    decode_parser.add_argument("--count", type=int, default=60)
+    decode_parser.add_argument("--repeat", type=int, default=5)
+    decode_parser.set_defaults(func=bench_decode)
+
+    card_parser = subparsers.add_parser("card", help="Cardのメモリ使用量とソート時間を計測する")
+    card_parser.add_argument("--repeat", type=int, default=2000)
+    card_parser.set_defaults(func=bench_card)
+
+    history_parser = subparsers.add_parser("history", help="Undo履歴のメモリ使用量とadd_turnの時間を計測する")
+    history_parser.add_argument("--actions", type=int, default=500)
+    history_parser.add_argument("--budget", type=int, default=4096, help="履歴の上限(KB)")
+    history_parser.set_defaults(func=bench_history)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+カード画像をまとめたパックファイルを扱うモジュール
+マスク適用、リサイズ済みのRGBA画像を1つのファイルに並べて保存し、mmapで開いて使う
+カード毎のファイルを開いてJPEGを展開する処理を省略できる
+
+python CardPack.py でCardフォルダからパックファイルを作成、更新する
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from typing import Callable
+from PIL import Image
+
+MAGIC = b"RCGP"
+VERSION = 1
+# MAGIC, VERSION, 索引の位置, 索引の長さ
+HEADER = struct.Struct("<4sIQQ")
+
+
+class CardPack:
+    """
+    パックファイルの読み込み
+    画像はmmapしたバッファからコピーして返すので、画像が残っていてもcloseできる
+    Windowsでは開いている間はパックファイルを置き換えられないので、作り直す前にcloseすること
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.buffer: mmap.mmap = None
+        self.index: dict[str, dict] = {}
+
+    def open(self) -> bool:
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) < HEADER.size:
+            return False
+        self.file = open(self.path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_offset, index_length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            print("パックファイルの形式が違います")
+            self.close()
+            return False
+        self.index = json.loads(self.buffer[index_offset: index_offset + index_length].decode("utf-8"))
+        return True
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.index = {}
+
+    def get_tile(self, card_id: str, size: tuple[int], card_hash: str=None) -> tuple[int] | None:
+        """
+        画像の(位置, 長さ)を取得する
+        card_hashを指定した場合、パック作成時と画像が変わっていれば None を返す
+        """
+        entry = self.index.get(card_id)
+        if entry is None or (card_hash is not None and entry["hash"] != card_hash):
+            return None
+        return entry["tiles"].get(f"{size[0]}x{size[1]}")
+
+    def get(self, card_id: str, size: tuple[int], card_hash: str=None) -> Image.Image | None:
+        if self.buffer is None:
+            return None
+        tile = self.get_tile(card_id, size, card_hash)
+        if tile is None:
+            return None
+        offset, length = tile
+        return Image.frombytes("RGBA", size, self.buffer[offset: offset + length])
+
+
+def build(
+        path: str,
+        catalog: dict[str, dict],
+        sizes: list[tuple[int]],
+        load: Callable,
+        resample: int=Image.BICUBIC
+    ):
+    """
+    パックファイルを作成する
+    catalogはcard_idからハッシュ値を含むカード情報を引く辞書
+    loadはcard_idからマスク適用済みの原寸画像を返す関数
+    既存のパックファイルにハッシュ値とサイズが同じ画像があればそのまま使う
+    """
+    old = CardPack(path)
+    old.open()
+    index = {}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for card_id, entry in catalog.items():
+            tiles = {}
+            image = None
+            for size in sizes:
+                key = f"{size[0]}x{size[1]}"
+                old_tile = old.get_tile(card_id, size, entry["hash"])
+                if old_tile is not None:
+                    data = old.buffer[old_tile[0]: old_tile[0] + old_tile[1]]
+                else:
+                    if image is None:
+                        image = load(card_id)
+                    data = image.resize(size, resample).convert("RGBA").tobytes()
+                tiles[key] = [f.tell(), len(data)]
+                f.write(data)
+            index[card_id] = {"hash": entry["hash"], "tiles": tiles}
+            count += 1
+            print(f"pack {count} / {len(catalog)}\t{card_id}")
+        index_data = json.dumps(index).encode("utf-8")
+        index_offset = f.tell()
+        f.write(index_data)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index_data)))
+    old.close()
+    os.replace(f"{path}.tmp", path)
+
+
+def main():
+    import Setting
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="Cache/cards.pack")
+    parser.add_argument("--sizes", nargs="*", help="例: 120x168 60x84 (省略時はカードサイズとその半分)")
+    args = parser.parse_args()
+    Setting.data.setting_load("USER_SETTING")
+    if args.sizes:
+        sizes = [tuple(map(int, size.split("x"))) for size in args.sizes]
+    else:
+        width, height = Setting.data.get_card_size()
+        sizes = [(width, height), (width // 2, height // 2)]
+    catalog = {}
+    for card_id in sorted(os.listdir("Card")):
+        if os.path.isdir(f"Card/{card_id}"):
+            entry = Setting.catalog.get(card_id)
+            if entry is not None:
+                catalog[card_id] = entry
+    Setting.catalog.save()
+    build(args.output, catalog, sizes, lambda card_id: Setting.container.get(card_id))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cardフォルダのカード情報を索引として保持するモジュール
+カードの生成や画像の読み込み時にフォルダの一覧を取得しなくて済むようにする
+"""
+
+import hashlib
+import json
+import os
+import threading
+from PIL import Image
+
+
+class CardCatalog:
+    """
+    card_idからカード名、カテゴリ、画像のパス、画像サイズ、ハッシュ値を引く索引
+    Card/catalog.jsonに保存する
+    addとremoveでは保存しないので、まとめて変更した後にsaveを呼ぶこと
+    """
+    def __init__(self, directory: str, filename: str="catalog.json"):
+        self.directory = directory
+        self.path = f"{directory}/{filename}"
+        self.dic: dict[str, dict] = None
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock:
+            self.dic = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self.dic = json.load(f)
+                except (OSError, ValueError):
+                    print("catalogの読み込みに失敗しました")
+                    self.dic = {}
+
+    def save(self):
+        """
+        変更が無い場合は何もしない
+        書き込み途中で終了しても壊れないように一時ファイルに書いてから置き換える
+        """
+        with self._lock:
+            if self.dic is None or not self.dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.dic, f, ensure_ascii=False)
+            os.replace(f"{self.path}.tmp", self.path)
+            self.dirty = False
+
+    def _get_dic(self) -> dict[str, dict]:
+        if self.dic is None:
+            self.load()
+        return self.dic
+
+    def get(self, card_id: str) -> dict | None:
+        """
+        カード情報を取得する
+        索引に無いが画像が存在する場合(索引作成前にダウンロードしたカード)は索引に追加する
+        """
+        with self._lock:
+            entry = self._get_dic().get(card_id)
+            if entry is None and os.path.isdir(f"{self.directory}/{card_id}"):
+                files = os.listdir(f"{self.directory}/{card_id}")
+                if len(files) == 1:
+                    category, _, name = files[0].rsplit(".", 1)[0].partition("_")
+                    entry = self.add(card_id, f"{self.directory}/{card_id}/{files[0]}", category, name)
+            return entry
+
+    def __contains__(self, card_id: str) -> bool:
+        return self.get(card_id) is not None
+
+    def add(self, card_id: str, path: str, category: str, name: str) -> dict:
+        with open(path, "rb") as f:
+            content = f.read()
+        with Image.open(path) as image:
+            size = list(image.size)
+        entry = {
+            "name": name,
+            "category": category,
+            "path": path,
+            "size": size,
+            "hash": hashlib.sha1(content).hexdigest()
+        }
+        with self._lock:
+            self._get_dic()[card_id] = entry
+            self.dirty = True
+        return entry
+
+    def remove(self, card_id: str):
+        with self._lock:
+            if self._get_dic().pop(card_id, None) is not None:
+                self.dirty = True
+
+    def card_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._get_dic().keys())
+
+
+class CardManifest:
+    """
+    起動時のCardフォルダ確認用に、各カードフォルダの更新時刻とファイル数を記録する
+    前回から更新時刻が変わったフォルダだけ中身を確認すれば良いようにする
+    """
+    def __init__(self, directory: str, filename: str="manifest.json"):
+        self.directory = directory
+        self.path = f"{directory}/{filename}"
+        self.dic: dict[str, list[int]] = {}
+
+    def load(self):
+        self.dic = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.dic = json.load(f)
+            except (OSError, ValueError):
+                self.dic = {}
+
+    def save(self):
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.dic, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def changed_entries(self, full_check: bool=False) -> tuple[list[os.DirEntry], list[str]]:
+        """
+        前回の記録から変化したカードフォルダと、無くなったカードフォルダのidを返す
+        full_checkがTrueの場合は全てのフォルダを変化したものとして返す
+        """
+        changed = []
+        found = set()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    continue
+                found.add(entry.name)
+                record = self.dic.get(entry.name)
+                if full_check or record is None or record[0] != entry.stat().st_mtime_ns:
+                    changed.append(entry)
+        removed = [card_id for card_id in self.dic if not card_id in found]
+        return changed, removed
+
+    def update(self, card_id: str, mtime: int, count: int):
+        self.dic[card_id] = [mtime, count]
+
+    def remove(self, card_id: str):
+        self.dic.pop(card_id, None)
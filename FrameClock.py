@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+アニメーションやタイマーを1つのafterループで動かすモジュール
+Tkのroot毎にFrameClockを1つだけ作り、全ての盤面で同じ周期で描画する
+"""
+
+import time
+import traceback
+import tkinter as tk
+from typing import Callable
+
+
+class Task:
+    """
+    FrameClockに登録する処理
+    callbackがFalseを返すと登録を解除する
+    """
+    def __init__(self, callback: Callable, interval: float):
+        self.callback = callback
+        self.interval = interval
+        self.next_time = 0.0
+        self.active = True
+
+
+class FrameClock:
+    """
+    登録された処理を目標FPSの周期でまとめて呼び出す
+    毎フレーム呼び出す処理が無い間は、次に呼び出す処理の時刻まで待機する
+    1回の呼び出しが1フレームの時間を超えた回数をoverrun_countに記録する
+    例外を投げた処理は登録を解除し、他の処理は止めずに呼び出し続ける
+    """
+    def __init__(self, root: tk.Misc, fps: int=60):
+        self.root = root
+        self.frame_time = 1 / fps
+        self.tasks: list[Task] = []
+        self.aff = None
+        self.frame_count = 0
+        self.overrun_count = 0
+
+    def add(self, callback: Callable, interval: float=0) -> Task:
+        """
+        callbackをinterval秒毎に呼び出す
+        intervalが0の場合は毎フレーム呼び出す
+        最初の呼び出しは次のフレーム
+        """
+        task = Task(callback, interval)
+        task.next_time = time.perf_counter()
+        self.tasks.append(task)
+        if self.aff is not None:
+            self.root.after_cancel(self.aff)
+        self.aff = self.root.after(0, self._tick)
+        return task
+
+    def remove(self, task: Task):
+        task.active = False
+        if task in self.tasks:
+            self.tasks.remove(task)
+        if not self.tasks and self.aff is not None:
+            self.root.after_cancel(self.aff)
+            self.aff = None
+
+    def _tick(self):
+        self.aff = None
+        start = time.perf_counter()
+        called = False
+        try:
+            for task in list(self.tasks):
+                if not task.active or task.next_time > start + self.frame_time / 2:
+                    continue
+                called = True
+                try:
+                    result = task.callback()
+                except Exception:
+                    traceback.print_exc()
+                    result = False
+                if result is False:
+                    self.remove(task)
+                    continue
+                interval = max(task.interval, self.frame_time)
+                task.next_time += interval
+                if task.next_time < start:
+                    task.next_time = start + interval
+            if called:
+                # フレーム内の変更を1回の描画にまとめる
+                self.root.update_idletasks()
+                self.frame_count += 1
+                if time.perf_counter() - start > self.frame_time:
+                    self.overrun_count += 1
+        finally:
+            if self.tasks and self.aff is None:
+                delay = min(task.next_time for task in self.tasks) - time.perf_counter()
+                self.aff = self.root.after(max(1, int(delay * 1000)), self._tick)
+
+_clocks: dict[tk.Tk, FrameClock] = {}
+
+def get_clock(widget: tk.Misc) -> FrameClock:
+    """
+    widgetが属するTkのrootのFrameClockを取得する
+    """
+    root = widget._root()
+    if not root in _clocks:
+        _clocks[root] = FrameClock(root)
+    return _clocks[root]
@@ -3,6 +3,7 @@
 
 from __future__ import annotations
 import random
+import sys
 import tkinter as tk
 from tkinter import filedialog
 from typing import Callable
@@ -20,12 +21,14 @@ class CardList:
         self.name: str = ""
         self.code: str = ""
         self.list: list[str] = []
+        self.prefetcher: Setting.CardPrefetcher = None
         self.image: ImageTk.PhotoImage = Setting.container.create_deck_image(
             self.list,
             (Setting.data.card_size[0] //2, Setting.data.card_size[1] //2)
         )
 
     def reset(self):
+        self.prefetch_cancel()
         self.list.clear()
         self.name = ""
         self.code = ""
@@ -55,6 +58,7 @@ class CardList:
         self.reset()
         data_list = Setting.create_deckid_list(deck_id)
         if data_list:
+            self.prefetch_start(data_list)
             c = 0
             for d in data_list:
                 c += 1
@@ -68,6 +72,27 @@ class CardList:
         else:
             print("デッキコードエラー\terror_id: d_001")
 
+    def prefetch_start(self, card_ids: list[str]):
+        """
+        カード画像の先読みを開始する
+        """
+        self.prefetch_cancel()
+        self.prefetcher = Setting.CardPrefetcher(card_ids)
+        self.prefetcher.start()
+
+    def prefetch_cancel(self):
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+
+    def prefetch_wait(self):
+        """
+        先読み中のカード画像のダウンロード完了を待つ
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.wait()
+            self.prefetcher = None
+
     def check(self):
         if len(self.list) == 60:
             return True
@@ -81,6 +106,33 @@ class CardList:
             f.writelines(self.code)
 
 
+class CardIndex:
+    """
+    ゲーム中の全てのカードの card.id → (ゾーン名, Card) の索引
+    positionにはFieldのカードの左上の座標を保持する
+    Masterとその子のGameSystemで1つを共有する
+    """
+    def __init__(self):
+        self.dic: dict[str, tuple[str, Object.Card]] = {}
+        self.position: dict[str, tuple[int]] = {}
+
+    def add(self, zone: str, card: Object.Card):
+        self.dic[card.id] = (zone, card)
+        if zone != "Field":
+            self.position.pop(card.id, None)
+
+    def remove(self, card: Object.Card):
+        self.dic.pop(card.id, None)
+        self.position.pop(card.id, None)
+
+    def get(self, card_id: str) -> tuple[str, Object.Card] | None:
+        return self.dic.get(card_id)
+
+    def get_zone(self, card_id: str) -> str | None:
+        entry = self.dic.get(card_id)
+        return entry[0] if entry is not None else None
+
+
 class GameSystem:
     """
     ゲームシステムの親クラス
@@ -92,12 +144,16 @@ class GameSystem:
         self.object_name = ""
         self.canvas: tk.Canvas = None
         self.menu: tk.Menu
+        self.card_index: CardIndex = None
 
     def clear(self):
+        for card in self.list:
+            if self.card_index.get_zone(card.id) == self.object_name:
+                self.card_index.remove(card)
         self.list.clear()
 
     def sort(self):
-        self.list.sort()
+        self.list.sort(key=Object.Card.sort_key)
         self.canvas_update()
 
     def _canvas_bind(self):
@@ -162,9 +218,6 @@ class GameSystem:
             tag = self.canvas.gettags(closest_ids[0])
             return tag
 
-    def get_tag_all(self):
-        return [self.canvas.gettags(num) for num in self.canvas.find_all()]
-
     def update(self):
         """
         FieldCanvasのオブジェクトを更新する
@@ -189,23 +242,81 @@ class GameSystem:
             card = self.list.pop(0)
         else:
             self.list.remove(card)
+        self.card_index.remove(card)
         return card
 
     def pop_card_all(self, add_system: GameSystem):
+        """
+        全てのカードをadd_systemに移動する
+        画面の更新は呼び出し側で行う
+        """
         for card in self.list:
-            add_system.add_card(card)
+            add_system.insert_card(card)
         self.list.clear()
 
-    def add_card(self, card: Object.Card, head: bool=False):
+    def insert_card(self, card: Object.Card, head: bool=False):
+        """
+        リストにだけカードを追加する
+        画面の更新は呼び出し側で行う
+        """
         if head:
             self.list.insert(0, card)
         else:
             self.list.append(card)
+        self.card_index.add(self.object_name, card)
+
+    def add_card(self, card: Object.Card, head: bool=False):
+        self.insert_card(card, head)
 
     def find_card(self, tag: str) -> Object.Card:
-        for card in self.list:
-            if card.id == tag:
-                return card
+        """
+        自クラスのリストにあるカードをtagから取得する
+        """
+        entry = self.card_index.get(tag)
+        if entry is not None and entry[0] == self.object_name:
+            return entry[1]
+
+
+class MoveTransaction:
+    """
+    複数のカード移動をまとめて行う
+    移動中はリストだけを更新し、commitで移動元と移動先のゾーンを1回ずつ再描画する
+    Master.transaction()をwith文で使う
+    入れ子にした場合は一番外側のwithを抜ける時にcommitする
+    """
+    def __init__(self, master: Master):
+        self.master = master
+        self.depth = 0
+        self.zones: dict[str, None] = {}
+
+    def __enter__(self) -> MoveTransaction:
+        self.depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth == 0:
+            self.commit()
+
+    def move(self, source: str, move_to: str, card: Object.Card=None, head: bool=False) -> Object.Card:
+        card = self.master.dic[source].pop_card(card)
+        if move_to == self.master.object_name:
+            # Fieldはカード1枚分の画像を追加するだけなのでその場で表示する
+            self.master.add_card(card, head)
+        else:
+            self.master.dic[move_to].insert_card(card, head)
+        self.zones[source] = None
+        self.zones[move_to] = None
+        return card
+
+    def commit(self):
+        self.master.active_transaction = None
+        for zone in self.zones:
+            obj = self.master.dic[zone]
+            if obj is not self.master:
+                obj.update()
+            obj.canvas_update()
+        self.zones.clear()
 
 
 class Master(GameSystem):
@@ -219,7 +330,7 @@ class Master(GameSystem):
         self.flag = False
         self.object_name = "Field"
         self.card_list: CardList = CardList()
-        self.canvas = self.canvas = tk.Canvas(
+        self.canvas = Object.GameCanvas(
             master,
             width=Setting.data.window_size[0],
             height=Setting.data.window_size[1],
@@ -294,16 +405,25 @@ class Master(GameSystem):
             "Side": self.side,
             "Lost": self.lost
         }
+        self.card_index = CardIndex()
+        self.active_transaction: MoveTransaction = None
+        for _, obj in self.dic.items():
+            obj.card_index = self.card_index
+            if obj is not self:
+                obj.transaction = self.transaction
         self.turn_manager = TurnManager(
             self.deck,
             self.hand,
             self.temp,
             self.trash,
             self.side,
-            self.lost
+            self.lost,
+            Setting.data.get_history_budget()
         )
         self.play_count = 0
         self.tag = ("_")
+        # ドラッグで一緒に動かすカードのtag
+        self.move_tags: list[str] = []
         self.x = None
         self.y = None
 
@@ -333,6 +453,7 @@ class Master(GameSystem):
             height=Setting.data.window_size[1],
             bg=Setting.data.canvas_color if not self.enemy_flag else Setting.data.enemy_canvas_color
         )
+        self.turn_manager.budget = Setting.data.get_history_budget()
         if self.flag:
             for _, obj in self.dic.items():
                 if obj.object_name != "Field":
@@ -369,14 +490,17 @@ class Master(GameSystem):
 
     def start(self):
         self.tag = ("_")
+        self.move_tags.clear()
         self.play_count = 0
         if not self.flag:
             self.flag = True
             for _, obj in self.dic.items():
                 obj.clear()
+            self.card_list.prefetch_wait()
             for index, card_id in enumerate(self.card_list.get()):
                 print(f"Card生成中  {index+1} / 60")
-                self.deck.add_card(Object.Card(index, card_id))
+                self.deck.insert_card(Object.Card(index, card_id))
+            Setting.catalog.save()
         else:
             self.canvas.delete("all")
             self.pop_card_all(self.deck)
@@ -387,10 +511,13 @@ class Master(GameSystem):
             self.lost.pop_card_all(self.deck)
         for _ in range(10):
             self.deck.shuffle()
-        for _ in range(7):
-            self.move_crad("Deck", "Hand")
-        for _ in range(6):
-            self.move_crad("Deck", "Side")
+        # 手札のWindowを先に作り、配ったカードはcommitの1回の再描画で表示する
+        self.hand.create_window()
+        with self.transaction():
+            for _ in range(7):
+                self.move_crad("Deck", "Hand")
+            for _ in range(6):
+                self.move_crad("Deck", "Side")
         self.coin.position_update(
             (
                 Setting.data.card_size[0] + 10,
@@ -402,12 +529,16 @@ class Master(GameSystem):
         self.energy.reset()
         self.support.reset()
         self.retreat.reset()
-        self.hand.create_window()
-        for _, obj in self.dic.items():
+        for name, obj in self.dic.items():
             obj.update()
+            # Deck, Hand, Sideはcommitで再描画済み
+            if not name in ("Deck", "Hand", "Side"):
+                obj.canvas_update()
         self.turn_manager.reset([], "Start")
 
     def end(self):
+        self.coin.stop()
+        self.shuffle.stop()
         for _, obj in self.dic.items():
             if obj.object_name == "Deck":
                 obj.close(True)
@@ -420,74 +551,61 @@ class Master(GameSystem):
         """
         Undo機能用の履歴を保存する関数
         """
-        add_list = []
-        for card in self.list:
-            x, y, _, _ = self.canvas.bbox(card.id)
-            add_list.append(
-                (
-                    (x, y),
-                    card
-                )
-            )
-        self.turn_manager.add(add_list, title)
+        self.turn_manager.add(
+            [(self.card_index.position[card.id], card) for card in self.list],
+            title
+        )
 
     def turn_plus(self):
-        manager_data = self.turn_manager.plus()
-        print(manager_data["title"])
-        for _, obj in self.dic.items():
-            if obj.object_name != self.object_name:
-                obj.list = manager_data[obj.object_name].copy()
-                obj.update()
-                obj.canvas_update()
-        for tag in self.get_tag_all():
-            if not "System" in tag[0]:
-                self.canvas.delete(tag[0])
-        self.list.clear()
-        for data in manager_data["Field"]:
-            self.list.append(data[1])
-            self.canvas.create_image(
-                data[0][0],
-                data[0][1],
-                anchor="nw",
-                image=data[1].image_tk,
-                tag=data[1].id
-            )
-        self.canvas_update()
+        self._turn_restore(self.turn_manager.plus())
 
     def turn_minus(self):
-        manager_data = self.turn_manager.minus()
+        self._turn_restore(self.turn_manager.minus())
+
+    def _turn_restore(self, manager_data: dict[str, tuple]):
         print(manager_data["title"])
         for _, obj in self.dic.items():
             if obj.object_name != self.object_name:
-                obj.list = manager_data[obj.object_name].copy()
+                obj.list = list(manager_data[obj.object_name])
+                for card in obj.list:
+                    self.card_index.add(obj.object_name, card)
+                    if obj.hidden:
+                        card.release()
                 obj.update()
                 obj.canvas_update()
-        for tag in self.get_tag_all():
-            if not "System" in tag[0]:
-                self.canvas.delete(tag[0])
+        for role in ("card", "selection", "overlay"):
+            self.canvas.delete_role(role)
+        self.move_tags.clear()
         self.list.clear()
-        for data in manager_data["Field"]:
-            self.list.append(data[1])
+        for position, card in manager_data["Field"]:
+            self.list.append(card)
+            self.card_index.add(self.object_name, card)
+            self.card_index.position[card.id] = position
             self.canvas.create_image(
-                data[0][0],
-                data[0][1],
+                position[0],
+                position[1],
                 anchor="nw",
-                image=data[1].image_tk,
-                tag=data[1].id
+                image=card.image_tk,
+                tag=card.id
             )
         self.canvas_update()
 
+    def transaction(self) -> MoveTransaction:
+        """
+        カード移動をまとめるトランザクションを取得する
+        with self.transaction(): の中のmove_cradは、withを抜ける時にまとめて画面を更新する
+        """
+        if self.active_transaction is None:
+            self.active_transaction = MoveTransaction(self)
+        return self.active_transaction
+
     def move_crad(self, source: str, move_to: str, card: Object.Card=None, head: bool=False):
         """
         カードの移動を行う関数
         ChildSystemからも呼び出す
         """
-        _card = self.dic[source].pop_card(card)
-        self.dic[source].update()
-        self.dic[source].canvas_update()
-        self.dic[move_to].add_card(_card, head)
-        self.dic[move_to].update()
-        self.dic[move_to].canvas_update()
+        with self.transaction() as transaction:
+            transaction.move(source, move_to, card, head)
 
     def add_card(self, card: Object.Card, head: bool=False):
         super().add_card(card, head)
@@ -498,14 +616,14 @@ class Master(GameSystem):
             image=card.image_tk,
             tag=card.id
         )
-        self.card_replace(card.id)
+        self.card_index.position[card.id] = self.card_replace(card.id)
         self.play_count += 1
 
     def update_card(self, card: Object.Card):
         """
         カードを指定してアップデートする
         """
-        x, y, _, _ = self.canvas.bbox(card.id)
+        x, y = self.card_index.position[card.id]
         self.canvas.delete(card.id)
         self.canvas.create_image(
             x, y,
@@ -524,9 +642,8 @@ class Master(GameSystem):
                     self.canvas.lower(card.id)
                 else:
                     self.canvas.lift(card.id)
-        for tag in self.get_tag_all():
-            if "System" in tag[0]:
-                self.canvas.lift(tag[0])
+        for tag in self.canvas.get_tags("system"):
+            self.canvas.lift(tag)
 
     def create_big_image(self, card: Object.Card):
         self.canvas.delete("show_image")
@@ -557,31 +674,40 @@ class Master(GameSystem):
         card = self.find_card(self.tag[0])
         card.card_stat_update(key)
         self.update_card(card)
+        self.add_turn(f"{key}\n{card.name}")
 
     def turn_next(self):
-        for tag in self.get_tag_all():
-            if not "System" in tag[0]:
-                card = self.find_card(tag[0])
-                card.turn_reset()
+        changed = False
+        for card in self.list:
+            if card.turn_reset():
                 self.update_card(card)
+                changed = True
         self.energy.reset()
         self.support.reset()
         self.retreat.reset()
+        # カードの状態が変わらない場合は、Undo履歴に空の手順を積まない
+        if changed:
+            self.add_turn("Turn_End")
 
-    def card_replace(self, tag: str):
+    def card_replace(self, tag: str) -> tuple[int]:
         """
         画面外に行ってしまったCardオブジェクトを画面内に戻す
+        戻した後の左上の座標を返す
         """
         add_move = 20
         left, top, right, bottom = self.canvas.bbox(tag)
+        x, y = 0, 0
         if left < 0:
-            self.canvas.move(tag, -(left-add_move), 0)
+            x -= left - add_move
         if top < 0:
-            self.canvas.move(tag, 0, -(top-add_move))
+            y -= top - add_move
         if Setting.data.window_size[0] < right:
-            self.canvas.move(tag, Setting.data.window_size[0] - (right+add_move), 0)
+            x += Setting.data.window_size[0] - (right+add_move)
         if Setting.data.window_size[1] < bottom:
-            self.canvas.move(tag, 0, Setting.data.window_size[1] - (bottom+add_move))
+            y += Setting.data.window_size[1] - (bottom+add_move)
+        if x or y:
+            self.canvas.move(tag, x, y)
+        return (left + x, top + y)
 
     def deck_shuffle(self):
         self.deck.shuffle()
@@ -623,6 +749,8 @@ class Master(GameSystem):
             else:
                 self.canvas_update()
                 self.canvas.addtag_withtag("move", tag[0])
+                if not tag[0] in self.move_tags:
+                    self.move_tags.append(tag[0])
                 self.x = event.x
                 self.y = event.y
         else:
@@ -653,16 +781,14 @@ class Master(GameSystem):
 
     def _button_release_1(self, event: tk.Event):
         if self.flag:
-            if ("rect", "current") in self.get_tag_all():
-                self.canvas.addtag_overlapping(
-                    "move",
-                    self.x, self.y,
-                    event.x, event.y
-                )
+            if self.canvas.has_tag("rect"):
                 self.play_count = 0
-                for t in self.get_tag_all():
-                    if "System" in t[0]:
-                        self.canvas.dtag(t[0], "move")
+                for item in self.canvas.find_overlapping(self.x, self.y, event.x, event.y):
+                    tag = self.canvas.get_tag(item)
+                    if tag is not None and self.canvas.get_role(tag) == "card":
+                        self.canvas.addtag_withtag("move", item)
+                        if not tag in self.move_tags:
+                            self.move_tags.append(tag)
             else:
                 tag = self.find_tag(event)
                 if "System" in tag[0]:
@@ -681,16 +807,19 @@ class Master(GameSystem):
                         move_to = "Lost"
                     if move_to:
                         names = ""
-                        move_card_id = [t[0] for t in self.get_tag_all() if "move" in t]
-                        if move_card_id:
-                            for card in [self.find_card(tag) for tag in move_card_id]:
-                                self.move_crad("Field", move_to, card)
-                                self.canvas.delete(card.id)
-                                names += f"{card.name}\n"
+                        cards = [self.find_card(tag) for tag in self.move_tags]
+                        cards = [card for card in cards if card is not None]
+                        if cards:
+                            with self.transaction():
+                                for card in cards:
+                                    self.move_crad("Field", move_to, card)
+                                    self.canvas.delete(card.id)
+                                    names += f"{card.name}\n"
                             self.add_turn(f"Field -> {move_to}\n{names}")
-                for tag in self.get_tag_all():
-                    if "move" in tag:
-                        self.card_replace(tag[0])
+                for tag in self.move_tags:
+                    if self.card_index.get_zone(tag) == self.object_name:
+                        self.card_index.position[tag] = self.card_replace(tag)
+                self.move_tags.clear()
                 self.canvas.dtag("move", "move")
             self.canvas.delete("rect")
 
@@ -730,6 +859,7 @@ class Master(GameSystem):
                     card.tail_flag = False
                     card._update_image_tk()
                     self.update_card(card)
+                    self.add_turn(f"表にする\n{card.name}")
                 else:
                     self.menu.post(event.x_root, event.y_root)
             else:
@@ -741,8 +871,11 @@ class Master(GameSystem):
             if tag[-1] == "current":
                 if not "System" in tag[0]:
                     card = self.find_card(tag[0])
+                    status = card.get_status()
                     card.hp_update(event.delta)
-                    self.update_card(card)
+                    if card.get_status() != status:
+                        self.update_card(card)
+                        self.add_turn(f"HP {card.hp}\n{card.name}")
                 elif tag[0] == "System_Deck":
                     pass
                     #マリガンカウント処理
@@ -755,17 +888,21 @@ class ChildSystem(GameSystem):
     対戦相手に画面共有しないデッキや手札等を管理するクラスの親クラス
     別ウィンドウでCanvasを表示するのでself.windowの記述が必要
     """
-    def __init__(self, enemy_flag, move_card: Callable, add_turn: Callable, field_canvas: tk.Canvas):
+    def __init__(self, enemy_flag, move_card: Callable, add_turn: Callable, field_canvas: Object.GameCanvas):
         super().__init__()
         self.enemy_flag = enemy_flag
         self.move_card_method = move_card
         self.add_turn = add_turn
         self.window = None
+        # Master.transaction
+        self.transaction: Callable = None
         self.field_canvas = field_canvas
         self.canvas: tk.Canvas
         self.position: tuple[int]
         self.window_size: tuple[int]
         self.tag = "_"
+        # Trueの場合はカードを見えない状態で保持するので、追加されたカードの画像を手放す
+        self.hidden = False
 
     def get(self) -> list[Object.Card]:
         return self.list.copy()
@@ -865,14 +1002,7 @@ class ChildSystem(GameSystem):
             len(self.list),
             color
         )
-        self.field_canvas.delete(f"System_{self.object_name}")
-        self.field_canvas.create_image(
-            self.position[0],
-            self.position[1],
-            anchor="nw",
-            image=self.image,
-            tag=f"System_{self.object_name}"
-        )
+        self.field_canvas.show_image(f"System_{self.object_name}", self.position, self.image)
 
     def canvas_update(self):
         """
@@ -904,16 +1034,16 @@ class ChildSystem(GameSystem):
             tag="show_image"
         )
 
-    def add_card(self, card: Object.Card, head: bool=False):
-        super().add_card(card, head)
-        self.update()
-        if self.window is not None:
-            self.canvas_update()
+    def insert_card(self, card: Object.Card, head: bool=False):
+        super().insert_card(card, head)
+        if self.hidden:
+            card.release()
 
     def move_card_all(self, move_to: str):
         self.tag = ("_")
-        while len(self.list):
-            self.move_card(move_to)
+        with self.transaction():
+            while len(self.list):
+                self.move_card_method(self.object_name, move_to)
         self.add_turn(f"{self.object_name} -> {move_to}\nall")
 
     def _button_1(self, event: tk.Event):
@@ -1021,6 +1151,7 @@ class Deck(ChildSystem):
     def __init__(self, enemy_flag, move_card, add_turn, canvas, deck_shuffle: Callable):
         super().__init__(enemy_flag, move_card, add_turn, canvas)
         self.object_name = "Deck"
+        self.hidden = True
         self.position = (
             Setting.data.window_size[0] - Setting.data.card_size[0],
             0
@@ -1127,6 +1258,7 @@ class Side(ChildSystem):
     def __init__(self, enemy_flag, move_card, add_turn, canvas):
         super().__init__(enemy_flag, move_card, add_turn, canvas)
         self.object_name = "Side"
+        self.hidden = True
         self.position = (
             0,
             Setting.data.window_size[1] - Setting.data.card_size[1]
@@ -1163,10 +1295,44 @@ class Lost(ChildSystem):
 
 
 
+class TurnEntry:
+    """
+    1手分の履歴
+    changesには変化したゾーンだけを (ゾーン名, 変化前, 変化後) で保存する
+    変化前は1つ前の手の変化後と同じtupleを参照するので、新しく増えるのは変化後のtupleだけ
+    statusにはステータスが変化したカードだけを (Card, 変化前, 変化後) で保存する
+    """
+    __slots__ = ("title", "changes", "status", "size")
+
+    def __init__(self, title: str, changes: tuple[tuple], status: tuple[tuple], size: int=0):
+        """
+        sizeには変化後のtuple以外に新しく作ったオブジェクトの大きさを渡す
+        """
+        self.title = title
+        self.changes = changes
+        self.status = status
+        self.size = size + sys.getsizeof(changes) + sys.getsizeof(status)
+        for change in changes + status:
+            self.size += sys.getsizeof(change) + sys.getsizeof(change[2])
+
+
 class TurnManager:
-    def __init__(self, deck, hand, temp, trash, side, lost):
-        self.data = []
+    """
+    Undo機能用の履歴
+    各ゾーンのカードをtupleで保持し、1手毎に変化したゾーンの差分だけを保存する
+    Fieldは((x, y), Card)のtuple
+    カードのHPとステータスはCard.get_statusのtupleでカード毎に保持する
+    履歴の大きさがbudgetを超えた場合は古い手から捨てる
+    """
+    def __init__(self, deck, hand, temp, trash, side, lost, budget: int=4*1024*1024):
+        self.entries: list[TurnEntry] = []
         self.index = 0
+        self.offset = 0
+        self.size = 0
+        self.budget = budget
+        self.title = ""
+        self.state: dict[str, tuple] = {}
+        self.status: dict[str, tuple] = {}
         self.deck: Deck = deck
         self.hand: Hand = hand
         self.temp: Temp = temp
@@ -1174,48 +1340,105 @@ class TurnManager:
         self.side: Side = side
         self.lost: Lost = lost
 
+    def _capture(self, field_data: list[tuple]) -> tuple[dict[str, tuple], int]:
+        """
+        現在の状態をゾーン毎のtupleにする
+        Fieldの位置が変わっていないカードは前回のtupleを使い回す
+        新しく作ったFieldのtupleの大きさも返す
+        """
+        old = {pair[1].id: pair for pair in self.state.get("Field", ())}
+        field = []
+        size = 0
+        for position, card in field_data:
+            pair = old.get(card.id)
+            if pair is None or pair[0] != position:
+                pair = (position, card)
+                size += sys.getsizeof(pair) + sys.getsizeof(position)
+            field.append(pair)
+        state = {"Field": tuple(field)}
+        for system in (self.deck, self.hand, self.temp, self.trash, self.side, self.lost):
+            state[system.object_name] = tuple(system.list)
+        return state, size
+
+    def _get_cards(self) -> list[Object.Card]:
+        cards = [card for _, card in self.state["Field"]]
+        for zone, cards_in in self.state.items():
+            if zone != "Field":
+                cards.extend(cards_in)
+        return cards
+
     def reset(self, field_data, title: str):
-        self.data.clear()
+        self.entries.clear()
         self.index = 0
-        dic = {
-            "title": title,
-            "Field": field_data,
-            "Deck": self.deck.get(),
-            "Hand": self.hand.get(),
-            "Temp": self.temp.get(),
-            "Trash": self.trash.get(),
-            "Side": self.side.get(),
-            "Lost": self.lost.get()
-        }
-        self.data.append(dic)
+        self.offset = 0
+        self.size = 0
+        self.title = title
+        self.state = {}
+        self.state = self._capture(field_data)[0]
+        self.status = {card.id: card.get_status() for card in self._get_cards()}
 
     def add(self, field_data, title: str):
-        dic = {
-            "title": title,
-            "Field": field_data,
-            "Deck": self.deck.get(),
-            "Hand": self.hand.get(),
-            "Temp": self.temp.get(),
-            "Trash": self.trash.get(),
-            "Side": self.side.get(),
-            "Lost": self.lost.get()
-        }
-        self.data = self.data[:self.index+1]
+        state, size = self._capture(field_data)
+        changes = []
+        for zone, after in state.items():
+            before = self.state[zone]
+            if after != before:
+                changes.append((zone, before, after))
+                self.state[zone] = after
+        status = []
+        for card in self._get_cards():
+            after = card.get_status()
+            before = self.status.get(card.id, after)
+            if after != before:
+                status.append((card, before, after))
+                self.status[card.id] = after
+        for entry in self.entries[self.index:]:
+            self.size -= entry.size
+        del self.entries[self.index:]
+        entry = TurnEntry(title, tuple(changes), tuple(status), size)
+        self.entries.append(entry)
         self.index += 1
-        self.data.append(dic)
+        self.size += entry.size
+        self._trim()
 
-    def plus(self) -> dict[str, list[Object.Card]]:
+    def _trim(self):
+        """
+        budgetを超えた分の古い履歴を捨てる
+        """
+        while self.size > self.budget and self.index > 1:
+            entry = self.entries.pop(0)
+            self.size -= entry.size
+            self.title = entry.title
+            self.index -= 1
+            self.offset += 1
+
+    def get(self) -> dict[str, tuple]:
+        dic = {"title": self.entries[self.index-1].title if self.index else self.title}
+        dic.update(self.state)
+        return dic
+
+    def plus(self) -> dict[str, tuple]:
         print("-------------------------")
-        self.index += 1
-        if self.index >= len(self.data)-1:
-            self.index = len(self.data)-1
-        print(f"{self.index} 手目")
-        return self.data[self.index]
-
-    def minus(self) -> dict[str, list[Object.Card]]:
+        if self.index < len(self.entries):
+            entry = self.entries[self.index]
+            for zone, _, after in entry.changes:
+                self.state[zone] = after
+            for card, _, after in entry.status:
+                card.set_status(after)
+                self.status[card.id] = after
+            self.index += 1
+        print(f"{self.offset + self.index} 手目")
+        return self.get()
+
+    def minus(self) -> dict[str, tuple]:
         print("-------------------------")
-        self.index -= 1
-        if self.index < 0:
-            self.index = 0
-        print(f"{self.index} 手目")
-        return self.data[self.index]
+        if self.index > 0:
+            self.index -= 1
+            entry = self.entries[self.index]
+            for zone, before, _ in entry.changes:
+                self.state[zone] = before
+            for card, before, _ in entry.status:
+                card.set_status(before)
+                self.status[card.id] = before
+        print(f"{self.offset + self.index} 手目")
+        return self.get()
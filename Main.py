@@ -5,8 +5,15 @@
 アプリケーション起動用ファイル
 """
 
+import time
+START_TIME = time.perf_counter()
+
+import argparse
 import Setting
+Setting.startup_timer.begin(START_TIME)
+Setting.startup_timer.mark("import Setting")
 import Application
+Setting.startup_timer.mark("import Application")
 
 NAME = "RemoteCardGameProgram"
 VERSITON = "0.2"
@@ -15,9 +22,19 @@ def main():
     """
     Application起動
     """
-    Setting.card_data_check()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full-check", action="store_true", help="Cardフォルダを全て確認する")
+    parser.add_argument("--timing", action="store_true", help="起動時間の内訳を表示する")
+    args = parser.parse_args()
+    Setting.startup_timer.enabled = args.timing
+    Setting.card_data_check(args.full_check)
+    Setting.startup_timer.mark("card_data_check")
     Setting.data.setting_load("USER_SETTING")
+    Setting.startup_timer.mark("setting_load")
+    Setting.container.setting_update()
+    Setting.startup_timer.mark("container.setting_update")
     Application.run(NAME, VERSITON)
+    Setting.catalog.save()
 
 if __name__ == "__main__":
     main()
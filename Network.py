@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+pokemon-card.comへの通信をまとめたモジュール
+通信はTransportを差し替えられるので、テストやベンチマークでは
+ローカルのサーバーや保存済みのページを使うことができる
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+BASE_URL = "https://www.pokemon-card.com"
+
+
+class TransportError(Exception):
+    """
+    通信自体に失敗した時の例外
+    """
+
+
+class HttpError(Exception):
+    """
+    リトライしても正常なレスポンスが得られなかった時の例外
+    """
+
+
+class Response:
+    def __init__(self, url: str, status: int, content: bytes, encoding: str="utf-8"):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class Transport:
+    """
+    通信方法の親クラス
+    子クラスでsendをオーバーライドして使う
+    """
+    def send(self, url: str, timeout: float) -> Response:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    requests.Sessionで接続を使い回す通常の通信方法
+    起動を速くするためにrequestsは初めて通信する時に読み込む
+    """
+    def __init__(self, pool_size: int=8):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.requests = requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, url: str, timeout: float) -> Response:
+        try:
+            r = self.session.get(url, timeout=timeout)
+        except self.requests.RequestException as e:
+            raise TransportError(str(e)) from e
+        return Response(url, r.status_code, r.content, r.encoding or "utf-8")
+
+    def close(self):
+        self.session.close()
+
+
+class FixtureTransport(Transport):
+    """
+    保存済みのレスポンスを返す通信方法
+    recordにTransportを渡すと実際に通信した結果をdirectoryに保存する
+    """
+    def __init__(self, directory: str, record: Transport=None):
+        self.directory = directory
+        self.record = record
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, url: str) -> str:
+        parts = urlsplit(url)
+        name = re.sub(r"[^0-9A-Za-z._-]", "_", f"{parts.netloc}{parts.path}").strip("_")
+        return f"{self.directory}/{name}"
+
+    def send(self, url: str, timeout: float) -> Response:
+        path = self.get_path(url)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                return Response(url, 200, f.read())
+        if self.record is None:
+            return Response(url, 404, b"")
+        response = self.record.send(url, timeout)
+        if response.status == 200:
+            with open(path, "wb") as f:
+                f.write(response.content)
+        return response
+
+
+class HttpClient:
+    """
+    タイムアウト、リトライ、ホスト毎の同時接続数制限を行うクライアント
+    """
+    def __init__(
+            self,
+            transport: Transport=None,
+            base_url: str=BASE_URL,
+            timeout: float=10,
+            retries: int=3,
+            backoff: float=0.5,
+            host_limit: int=6
+        ):
+        self._transport: Transport = transport
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.host_limit = host_limit
+        self.semaphores: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self) -> Transport:
+        with self._lock:
+            if self._transport is None:
+                self._transport = RequestsTransport(self.host_limit)
+            return self._transport
+
+    def set_transport(self, transport: Transport):
+        if self._transport is not None:
+            self._transport.close()
+        self._transport = transport
+
+    def get_url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}{path}"
+
+    def _get_semaphore(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if not host in self.semaphores:
+                self.semaphores[host] = threading.Semaphore(self.host_limit)
+            return self.semaphores[host]
+
+    def _wait(self, attempt: int):
+        """
+        リトライ前の待機
+        同時に失敗したリクエストが一斉に再送しないようにランダムな揺らぎを加える
+        """
+        time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def get(self, path: str) -> Response:
+        """
+        pathはBASE_URLからの相対パスか完全なURLを指定する
+        """
+        url = self.get_url(path)
+        error = ""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._wait(attempt - 1)
+            try:
+                with self._get_semaphore(url):
+                    response = self.transport.send(url, self.timeout)
+            except TransportError as e:
+                error = str(e)
+                continue
+            if response.status == 429 or response.status >= 500:
+                error = f"status {response.status}"
+                continue
+            if response.status >= 400:
+                raise HttpError(f"{url}: status {response.status}")
+            return response
+        raise HttpError(f"{url}: {error}")
+
+
+client = HttpClient()
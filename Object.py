@@ -3,40 +3,116 @@
 
 from __future__ import annotations
 import random
-import os
 import tkinter as tk
 from PIL import Image, ImageTk
 import Setting
+import FrameClock
+
+
+# Card.flagsのビット
+CHECK = 1
+DOKU = 2
+YAKEDO = 4
+TAIL = 8
+# Card.bad_codeに対応する特殊状態
+BAD_STAT = ["", "ねむり", "まひ", "こんらん"]
 
 
 class Card:
     """
     カードクラス
+    ゲーム中に大量に生成、比較するので__slots__で属性を固定する
+    check, どく, やけど, 裏向きはflagsのビット、特殊状態はbad_codeの番号で保持する
     """
+    __slots__ = ("card_id", "index", "id", "category", "name", "hp", "flags", "bad_code", "move", "_image_tk")
+
     def __init__(self, index: int, card_id: str):
         self.card_id = card_id
+        self.index = index
         self.id = f"id_{str(index)}"
-        self.image = Setting.container.get(card_id)
-        self.image_tk: ImageTk.PhotoImage
-        filename = os.listdir(f"Card/{card_id}")[0]
-        self.check = False
-        self.doku = False
-        self.yakedo = False
-        self.bad_stat = ""
-        self.tail_flag = False
-        self.category, self.name = filename.replace(".jpg", "").split("_")
+        self._image_tk: ImageTk.PhotoImage = None
+        entry = Setting.container.get_entry(card_id)
+        self.flags = 0
+        self.bad_code = 0
+        self.category = entry["category"]
+        self.name = entry["name"]
         if self.category == "ポケモン":
             self.hp = 0
         else:
             self.hp = None
         self.move = False
-        self._update_image_tk()
+
+    def _get_flag(self, bit: int) -> bool:
+        return bool(self.flags & bit)
+
+    def _set_flag(self, bit: int, value: bool):
+        if value:
+            self.flags |= bit
+        else:
+            self.flags &= ~bit
+
+    @property
+    def check(self) -> bool:
+        return self._get_flag(CHECK)
+
+    @check.setter
+    def check(self, value: bool):
+        self._set_flag(CHECK, value)
+
+    @property
+    def doku(self) -> bool:
+        return self._get_flag(DOKU)
+
+    @doku.setter
+    def doku(self, value: bool):
+        self._set_flag(DOKU, value)
+
+    @property
+    def yakedo(self) -> bool:
+        return self._get_flag(YAKEDO)
+
+    @yakedo.setter
+    def yakedo(self, value: bool):
+        self._set_flag(YAKEDO, value)
+
+    @property
+    def tail_flag(self) -> bool:
+        return self._get_flag(TAIL)
+
+    @tail_flag.setter
+    def tail_flag(self, value: bool):
+        self._set_flag(TAIL, value)
+
+    @property
+    def bad_stat(self) -> str:
+        return BAD_STAT[self.bad_code]
+
+    @bad_stat.setter
+    def bad_stat(self, value: str):
+        self.bad_code = BAD_STAT.index(value)
 
     def _get_index(self):
-        return int(self.id.replace("id_", ""))
+        return self.index
 
     def __lt__(self, other: Card):
-        return self._get_index() < other._get_index()
+        return self.index < other.index
+
+    @staticmethod
+    def sort_key(card: Card) -> int:
+        return card.index
+
+    def get_status(self) -> tuple:
+        """
+        Undo用にHPとステータスをtupleで取得する
+        """
+        return (self.hp, self.flags, self.bad_code)
+
+    def set_status(self, status: tuple):
+        """
+        get_statusで取得した状態に戻す
+        """
+        self.hp, self.flags, self.bad_code = status
+        self._update_image_tk()
 
     def card_tail(self):
         self.tail_flag = True
@@ -48,18 +124,20 @@ class Card:
         """
         if self.hp is not None:
             self.hp = 0
-        self.doku = False
-        self.yakedo = False
-        self.bad_stat = ""
-        self.check = False
-        self.tail_flag = False
+        self.flags = 0
+        self.bad_code = 0
+        self._update_image_tk()
 
-    def turn_reset(self):
+    def turn_reset(self) -> bool:
         """
         ターン経過時の処理
+        見た目が変わった場合にTrueを返す
         """
+        if not self.check:
+            return False
         self.check = False
         self._update_image_tk()
+        return True
 
     def hp_update(self, delta):
         if self.hp is not None:
@@ -69,7 +147,7 @@ class Card:
                 self.hp -= 10
                 if self.hp < 0:
                     self.hp = 0
-        self._update_image_tk()
+            self._update_image_tk()
 
     def card_stat_update(self, key: str):
         if key == "check":
@@ -86,95 +164,213 @@ class Card:
         self._update_image_tk()
 
     def _get_card_icon(self, key: str) -> Image.Image:
-        image = Setting.container.get(f"System_{key}")
-        image.thumbnail(
-            (Setting.data.card_size[0] // 3, Setting.data.card_size[0] // 3),
-            Image.LANCZOS
-        )
-        return image
+        return Setting.container.get_icon(key)
+
+    def _get_state_key(self) -> tuple:
+        """
+        見た目を決めるステータスをまとめたキー
+        同じ見た目のカードは同じPhotoImageを共有する
+        """
+        size = Setting.data.get_card_size()
+        if self.flags & TAIL:
+            return ("System_Card", size, None, TAIL, 0)
+        if self.hp is None:
+            return (self.card_id, size, None, self.flags & CHECK, 0)
+        return (self.card_id, size, self.hp, self.flags, self.bad_code)
+
+    @property
+    def image_tk(self) -> ImageTk.PhotoImage:
+        """
+        画面に表示する時に初めて画像を生成する
+        """
+        if self._image_tk is None:
+            self._image_tk = Setting.container.get_card_tk(self._get_state_key(), self._create_image)
+        return self._image_tk
 
     def _update_image_tk(self):
+        """
+        ステータスが変わった時に呼び出す
+        画像は次に表示する時に作り直す
+        """
+        self._image_tk = None
+
+    def release(self):
+        """
+        表示しないゾーンに移動した時に画像の参照を手放す
+        """
+        self._image_tk = None
+
+    def _create_image(self) -> Image.Image:
+        """
+        ステータスのアイコンやHPを重ねたカード画像を生成する
+        """
         if self.tail_flag:
-            self.image_tk = ImageTk.PhotoImage(
-                Setting.container.get("System_Card").resize(Setting.data.get_card_size())
-            )
-        else:
-            image = self.image.copy().resize(Setting.data.get_card_size())
-            if self.hp is not None:
-                if self.doku:
-                    stat_image = self._get_card_icon("doku")
-                    image.paste(
-                        stat_image,
-                        (0, 0),
-                        mask=stat_image
-                    )
-                if self.yakedo:
-                    stat_image = self._get_card_icon("yakedo")
-                    image.paste(
-                        stat_image,
-                        (Setting.data.card_size[0] // 3, 0),
-                        mask=stat_image
-                    )
-                if self.bad_stat != "":
-                    if self.bad_stat == "ねむり":
-                        stat_image = self._get_card_icon("nemuri")
-                    elif self.bad_stat == "まひ":
-                        stat_image = self._get_card_icon("mahi")
-                    elif self.bad_stat == "こんらん":
-                        stat_image = self._get_card_icon("konran")
-                    image.paste(
-                        stat_image,
-                        (0, Setting.data.card_size[0] // 3),
-                        mask=stat_image
-                    )
-                hp_image = Setting.container.create_text(self.hp, "white")
+            return Setting.container.get_resized("System_Card", Setting.data.get_card_size())
+        image = Setting.container.get_resized(self.card_id, Setting.data.get_card_size()).copy()
+        if self.hp is not None:
+            if self.doku:
+                stat_image = self._get_card_icon("doku")
+                image.paste(
+                    stat_image,
+                    (0, 0),
+                    mask=stat_image
+                )
+            if self.yakedo:
+                stat_image = self._get_card_icon("yakedo")
                 image.paste(
-                    hp_image,
-                    (
-                        image.size[0] - hp_image.size[0] -5,
-                        image.size[1] - hp_image.size[1] -5,
-                    ),
-                    mask=hp_image
+                    stat_image,
+                    (Setting.data.card_size[0] // 3, 0),
+                    mask=stat_image
                 )
-            if self.check:
-                check_image = self._get_card_icon("check")
+            if self.bad_stat != "":
+                if self.bad_stat == "ねむり":
+                    stat_image = self._get_card_icon("nemuri")
+                elif self.bad_stat == "まひ":
+                    stat_image = self._get_card_icon("mahi")
+                elif self.bad_stat == "こんらん":
+                    stat_image = self._get_card_icon("konran")
                 image.paste(
-                    check_image,
-                    (Setting.data.card_size[0] // 3 * 2, 0),
-                    mask=check_image
+                    stat_image,
+                    (0, Setting.data.card_size[0] // 3),
+                    mask=stat_image
                 )
-            self.image_tk = ImageTk.PhotoImage(image)
+            hp_image = Setting.container.create_text(self.hp, "white")
+            image.paste(
+                hp_image,
+                (
+                    image.size[0] - hp_image.size[0] -5,
+                    image.size[1] - hp_image.size[1] -5,
+                ),
+                mask=hp_image
+            )
+        if self.check:
+            check_image = self._get_card_icon("check")
+            image.paste(
+                check_image,
+                (Setting.data.card_size[0] // 3 * 2, 0),
+                mask=check_image
+            )
+        return image
 
 
 
+class GameCanvas(tk.Canvas):
+    """
+    作成したアイテムをtag毎、役割毎に記録するCanvas
+    イベント処理の度にCanvasの全てのアイテムのtagを取得しなくて済むようにする
+    役割はtagから決める
+        system: System_から始まるシステムオブジェクト
+        selection: 範囲選択の矩形
+        overlay: 拡大表示等の一時的な画像
+        card: それ以外(Cardのid)
+    """
+    ROLES = ("system", "card", "selection", "overlay")
+
+    def __init__(self, master, **kw):
+        super().__init__(master, **kw)
+        self.items: dict[str, list[int]] = {}
+        self.item_tags: dict[int, str] = {}
+        self.roles: dict[str, dict[str, None]] = {role: {} for role in self.ROLES}
+
+    @staticmethod
+    def get_role(tag: str) -> str:
+        if tag.startswith("System"):
+            return "system"
+        if tag == "rect":
+            return "selection"
+        if tag == "show_image":
+            return "overlay"
+        return "card"
+
+    def _register(self, item: int, kw: dict) -> int:
+        tag = kw.get("tag", kw.get("tags"))
+        if tag:
+            self.items.setdefault(tag, []).append(item)
+            self.item_tags[item] = tag
+            self.roles[self.get_role(tag)][tag] = None
+        return item
+
+    def create_image(self, *args, **kw) -> int:
+        return self._register(super().create_image(*args, **kw), kw)
+
+    def create_rectangle(self, *args, **kw) -> int:
+        return self._register(super().create_rectangle(*args, **kw), kw)
+
+    def delete(self, *args):
+        for arg in args:
+            if arg == "all":
+                self.items.clear()
+                self.item_tags.clear()
+                for tags in self.roles.values():
+                    tags.clear()
+            elif arg in self.items:
+                for item in self.items.pop(arg):
+                    self.item_tags.pop(item, None)
+                self.roles[self.get_role(arg)].pop(arg, None)
+            elif arg in self.item_tags:
+                tag = self.item_tags.pop(arg)
+                self.items[tag].remove(arg)
+                if not self.items[tag]:
+                    del self.items[tag]
+                    self.roles[self.get_role(tag)].pop(tag, None)
+        super().delete(*args)
+
+    def delete_role(self, role: str):
+        tags = list(self.roles[role])
+        if tags:
+            self.delete(*tags)
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self.items
+
+    def get_tag(self, item: int) -> str | None:
+        return self.item_tags.get(item)
+
+    def get_tags(self, role: str) -> list[str]:
+        return list(self.roles[role])
+
+    def show_image(self, tag: str, position: tuple[int], image: ImageTk.PhotoImage):
+        """
+        tagの画像を表示する
+        既に表示されている場合は作り直さずに位置と画像だけを差し替える
+        """
+        items = self.items.get(tag)
+        if items:
+            self.coords(items[0], position[0], position[1])
+            self.itemconfigure(items[0], image=image)
+        else:
+            self.create_image(
+                position[0],
+                position[1],
+                anchor="nw",
+                image=image,
+                tag=tag
+            )
+
+
 class Coin:
     """
     コインクラス
-    回転処理は後回し
+    表と裏のPhotoImageは全てのCoinで共有する
+    アニメーションはFrameClockの1フレーム毎に1コマ進める
     """
-    def __init__(self, master: tk.Tk, canvas: tk.Canvas):
+    def __init__(self, master: tk.Tk, canvas: GameCanvas):
         self.master = master
         self.canvas = canvas
+        self.clock = FrameClock.get_clock(master)
         self.position = None
-        self.head_image = Image.open("Misc/coin_head.png").resize((Setting.data.card_size[0], Setting.data.card_size[0]))
-        self.tail_image = Image.open("Misc/coin_tail.png").resize((Setting.data.card_size[0], Setting.data.card_size[0]))
-        self.image = ImageTk.PhotoImage(self.head_image)
-        self.aff = None
+        self.frames: list[ImageTk.PhotoImage] = Setting.container.get_animation_frames("coin")
+        self.image = self.frames[0]
+        self.task: FrameClock.Task = None
 
     def position_update(self, position: tuple[int]):
         self.position = position
-        self.image = ImageTk.PhotoImage(self.head_image)
+        self.frames = Setting.container.get_animation_frames("coin")
+        self.image = self.frames[0]
         self.view()
 
     def view(self):
-        self.canvas.delete("System_Coin")
-        self.canvas.create_image(
-            self.position[0],
-            self.position[1],
-            anchor="nw",
-            image=self.image,
-            tag="System_Coin"
-        )
+        self.canvas.show_image("System_Coin", self.position, self.image)
 
     def create_bool(self) -> bool:
         """
@@ -184,43 +380,49 @@ class Coin:
 
     def toss(self):
         self.roll_count = random.randint(10, 20)
-        if self.aff is not None:
-            self.master.after_cancel(self.aff)
-        self.roll()
+        if self.task is not None:
+            self.clock.remove(self.task)
+        self.task = self.clock.add(self.roll)
 
-    def roll(self):
-        if self.roll_count % 2:
-            img = self.head_image.copy()
-        else:
-            img = self.tail_image.copy()
-        self.image = ImageTk.PhotoImage(img)
+    def stop(self):
+        """
+        投げている途中のコインのアニメーションを止める
+        """
+        if self.task is not None:
+            self.clock.remove(self.task)
+            self.task = None
+
+    def roll(self) -> bool:
+        self.image = self.frames[0 if self.roll_count % 2 else 1]
         self.view()
         self.roll_count -= 1
         if self.roll_count:
-            self.aff = self.master.after(16, self.roll)
-        else:
-            self.master.after_cancel(self.aff)
-            res = self.create_bool()
-            if res:
-                img = self.head_image.copy()
-            else:
-                img = self.tail_image.copy()
-            self.image = ImageTk.PhotoImage(img)
-            self.view()
-            print("finish")
+            return True
+        self.task = None
+        res = self.create_bool()
+        self.image = self.frames[0 if res else 1]
+        self.view()
+        print("finish")
+        return False
 
 
 class Shuffle:
-    def __init__(self, master: tk.Tk, canvas: tk.Canvas):
+    """
+    シャッフルボタン
+    回転アニメーションのPhotoImageは全てのShuffleで共有する
+    アニメーションはFrameClockの1フレーム毎に1コマ進める
+    """
+    def __init__(self, master: tk.Tk, canvas: GameCanvas):
         self.master = master
         self.canvas = canvas
+        self.clock = FrameClock.get_clock(master)
         self.position = (
             Setting.data.window_size[0] - Setting.data.card_size[0],
             Setting.data.card_size[1] + 10
         )
-        self.image_data = Image.open("Misc/Shuffle.png").resize((Setting.data.card_size[0], Setting.data.card_size[0]))
-        self.image = ImageTk.PhotoImage(self.image_data)
-        self.aff = None
+        self.frames: list[ImageTk.PhotoImage] = Setting.container.get_animation_frames("shuffle")
+        self.image = self.frames[0]
+        self.task: FrameClock.Task = None
         self.angle = 0
 
     def position_update(self):
@@ -228,43 +430,47 @@ class Shuffle:
             Setting.data.window_size[0] - Setting.data.card_size[0],
             Setting.data.card_size[1] + 10
         )
+        self.frames = Setting.container.get_animation_frames("shuffle")
+        self.image = self.frames[self.angle // 10]
         self.view()
 
     def view(self):
-        self.canvas.delete("System_Shuffle")
-        self.canvas.create_image(
-            self.position[0],
-            self.position[1],
-            anchor="nw",
-            image=self.image,
-            tag="System_Shuffle"
-        )
+        self.canvas.show_image("System_Shuffle", self.position, self.image)
 
-    def shuffle(self):
+    def shuffle(self) -> bool:
         self.angle += 10
-        if self.angle > 360:
-            self.master.after_cancel(self.aff)
-            self.aff = None
+        running = self.angle <= 360
+        if not running:
+            self.task = None
             self.angle = 0
-        else:
-            self.aff = self.master.after(8, self.shuffle)
-        self.image = ImageTk.PhotoImage(self.image_data.rotate(self.angle))
+        self.image = self.frames[self.angle // 10]
         self.view()
+        return running
 
     def shuffle_start(self):
-        if self.aff is not None:
-            self.master.after_cancel(self.aff)
-            self.aff = None
+        if self.task is not None:
+            self.clock.remove(self.task)
+            self.task = None
             self.angle = 0
-            self.image = ImageTk.PhotoImage(self.image_data.rotate(0))
+            self.image = self.frames[0]
             self.view()
         else:
-            self.shuffle()
+            self.task = self.clock.add(self.shuffle)
+
+    def stop(self):
+        """
+        回転の途中のアニメーションを止める
+        """
+        if self.task is not None:
+            self.clock.remove(self.task)
+            self.task = None
+            self.angle = 0
+            self.image = self.frames[0]
 
 
 
 class CheckObject:
-    def __init__(self, canvas: tk.Canvas):
+    def __init__(self, canvas: GameCanvas):
         self.canvas = canvas
         self.flag = False
         self.object_name: str
@@ -285,14 +491,7 @@ class CheckObject:
             self.image = ImageTk.PhotoImage(self.true_image)
         else:
             self.image = ImageTk.PhotoImage(self.false_image)
-        self.canvas.delete(f"System_{self.object_name}")
-        self.canvas.create_image(
-            self.position[0],
-            self.position[1],
-            anchor="nw",
-            image=self.image,
-            tag=f"System_{self.object_name}"
-        )
+        self.canvas.show_image(f"System_{self.object_name}", self.position, self.image)
 
     def reset(self):
         self.flag = False
@@ -303,8 +502,8 @@ class VstarObject(CheckObject):
     def __init__(self, canvas) -> None:
         super().__init__(canvas)
         self.object_name = "Vstar"
-        self.true_image = Image.open("Misc/Vstar_check.png").resize((Setting.data.card_size[1], Setting.data.card_size[1] //2))
-        self.false_image = Image.open("Misc/Vstar.png").resize(self.true_image.size)
+        self.true_image = Setting.container.get_icon("Vstar_check")
+        self.false_image = Setting.container.get_icon("Vstar")
         self.image = ImageTk.PhotoImage(self.false_image)
         self.position = (
             Setting.data.window_size[0] - Setting.data.card_size[0] - Setting.data.card_size[1] - 10,
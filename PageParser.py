@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+pokemon-card.comのページから必要な部分だけを取り出すモジュール
+ページ全体を木構造に変換せず、ページのバイト列に対して正規表現で必要なタグだけを探す
+"""
+
+import html
+import re
+
+TAG_ATTR = re.compile(rb'([\w-]+)\s*=\s*"([^"]*)"')
+INPUT_TAG = re.compile(rb"<input\b[^>]*>", re.IGNORECASE)
+IMG_TAG = re.compile(rb"<img\b[^>]*>", re.IGNORECASE)
+CARD_NAME = re.compile(rb'<h1 class="Heading1 mt20">(.*?)</h1>', re.DOTALL)
+CARD_CATEGORY = re.compile(rb'<h2 class="mt20">(.*?)</h2>', re.DOTALL)
+
+
+class ParseError(Exception):
+    """
+    ページに必要な情報が見つからなかった時の例外
+    """
+
+
+def _get_attrs(tag: bytes) -> dict[bytes, bytes]:
+    return {key.lower(): value for key, value in TAG_ATTR.findall(tag)}
+
+def _get_text(data: bytes) -> str:
+    return html.unescape(data.decode("utf-8", errors="replace")).strip()
+
+def parse_deck_ids(content: bytes) -> list[str]:
+    """
+    デッキページのdeck_*という名前のhidden inputから、カードIDを枚数分並べたリストを作る
+    valueは「カードID_枚数_番号」を「-」で繋いだ形式
+    """
+    card_list = []
+    for tag in INPUT_TAG.findall(content):
+        attrs = _get_attrs(tag)
+        if attrs.get(b"type", b"").lower() != b"hidden":
+            continue
+        if not attrs.get(b"name", attrs.get(b"id", b"")).startswith(b"deck_"):
+            continue
+        value = attrs.get(b"value", b"").decode("utf-8", errors="replace")
+        for data in value.split("-"):
+            if not data:
+                continue
+            card_id, length = data.split("_")[0:2]
+            card_list.extend([card_id] * int(length))
+    return card_list
+
+def parse_card_detail(content: bytes) -> tuple[str, str, str]:
+    """
+    カード詳細ページからカード名、カテゴリ、カード画像のURLを取り出す
+    """
+    name = CARD_NAME.search(content)
+    category = CARD_CATEGORY.search(content)
+    image_url = None
+    for tag in IMG_TAG.findall(content):
+        attrs = _get_attrs(tag)
+        if b"fit" in attrs.get(b"class", b"").split():
+            image_url = attrs.get(b"src")
+            break
+    if name is None or category is None or image_url is None:
+        raise ParseError("カード情報が見つかりません")
+    return (
+        _get_text(name.group(1)),
+        _get_text(category.group(1)),
+        html.unescape(image_url.decode("utf-8"))
+    )
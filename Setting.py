@@ -2,14 +2,65 @@
 # -*- coding: utf-8 -*-
 
 import configparser
+import hashlib
+import json
 import os
-import requests
-import re
-from bs4 import BeautifulSoup
+from collections import OrderedDict
+from typing import Callable
 import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk, ImageDraw, ImageFont
+import Network
+import Catalog
+import PageParser
+import CardPack
 
 debug = False
+# 縮小画像を作る時の画質設定
+# quality: 原寸で展開してからリサイズ
+# balanced: JPEGを表示サイズの2倍程度に縮小展開してからリサイズ
+# speed: JPEGを表示サイズ程度に縮小展開してからバイリニアでリサイズ
+IMAGE_QUALITY = ["quality", "balanced", "speed"]
+# Cache/previewに残すデッキ画像の数
+PREVIEW_LIMIT = 50
+
+
+class StartupTimer:
+    """
+    起動時間の内訳を計測する
+    enabledがTrueの場合のみreportで結果を表示する
+    """
+    def __init__(self):
+        self.enabled = False
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.records: list[tuple[str, float]] = []
+
+    def begin(self, start: float):
+        """
+        計測の開始時刻を設定する
+        モジュールの読み込み時間も計測するため、Main.pyの先頭で取得した時刻を渡す
+        """
+        self.start = start
+        self.last = start
+        self.records.clear()
+
+    def mark(self, label: str):
+        now = time.perf_counter()
+        self.records.append((label, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("-------- 起動時間 --------")
+        for label, elapsed in self.records:
+            print(f"{label:<24}{elapsed * 1000:8.1f} ms")
+        print(f"{'合計':<24}{(self.last - self.start) * 1000:8.1f} ms")
+
+startup_timer = StartupTimer()
 
 class Setting:
     def __init__(self):
@@ -18,6 +69,10 @@ class Setting:
         self.card_size: tuple[int] = None
         self.canvas_color: str = None
         self.enemy_canvas_color: str = None
+        self.image_cache_budget: int = 64
+        self.original_image_budget: int = 16
+        self.image_quality: str = "balanced"
+        self.history_budget: int = 4
         self.text_font_path: str = "Misc/meiryo.ttc"
         self.number_font_path: str = "Misc/Molot.ttc"
         self.ini = configparser.SafeConfigParser()
@@ -46,6 +101,12 @@ class Setting:
         )
         self.canvas_color: str = self.ini.get(section, "CANVAS_COLOR")
         self.enemy_canvas_color: str = self.ini.get(section, "ENEMY_CANVAS_COLOR")
+        self.image_cache_budget = self.ini.getint(section, "IMAGE_CACHE_BUDGET", fallback=64)
+        self.original_image_budget = self.ini.getint(section, "ORIGINAL_IMAGE_BUDGET", fallback=16)
+        self.image_quality = self.ini.get(section, "IMAGE_QUALITY", fallback="balanced")
+        if not self.image_quality in IMAGE_QUALITY:
+            self.image_quality = "balanced"
+        self.history_budget = self.ini.getint(section, "HISTORY_BUDGET", fallback=4)
 
     def default_ini(self):
         print("初期設定に戻します")
@@ -63,6 +124,10 @@ class Setting:
         self.ini.set("USER_SETTING", "ENEMY_WINDOW_POSITION_Y", str(self.enemy_window_position[1]))
         self.ini.set("USER_SETTING", "CANVAS_COLOR", self.canvas_color)
         self.ini.set("USER_SETTING", "ENEMY_CANVAS_COLOR", self.enemy_canvas_color)
+        self.ini.set("USER_SETTING", "IMAGE_CACHE_BUDGET", str(self.image_cache_budget))
+        self.ini.set("USER_SETTING", "ORIGINAL_IMAGE_BUDGET", str(self.original_image_budget))
+        self.ini.set("USER_SETTING", "IMAGE_QUALITY", self.image_quality)
+        self.ini.set("USER_SETTING", "HISTORY_BUDGET", str(self.history_budget))
         with open("Setting.ini", "w") as f:
             self.ini.write(f)
 
@@ -147,152 +212,687 @@ class Setting:
         else:
             return self.canvas_color
 
+    def get_image_cache_budget(self) -> int:
+        """
+        画像キャッシュの上限をバイト数で取得する
+        iniファイルにはMB単位で保存している
+        """
+        return self.image_cache_budget * 1024 * 1024
+
+    def get_original_image_budget(self) -> int:
+        """
+        原寸のカード画像を保持する上限をバイト数で取得する
+        """
+        return self.original_image_budget * 1024 * 1024
+
+    def get_history_budget(self) -> int:
+        """
+        Undo用の履歴を保持する上限をバイト数で取得する
+        """
+        return self.history_budget * 1024 * 1024
+
+
+class ImageCache:
+    """
+    画像を保持するLRUキャッシュ
+    保持している画像の合計バイト数がbudgetを超えると古い順に破棄する
+    measure引数に画像1枚のバイト数を求める関数を指定する(省略時はPIL画像として計算)
+    保持している画像は共有されるので、加工する場合はcopyしてから使う
+    """
+    def __init__(self, budget: int, measure: Callable=None):
+        self.budget = budget
+        self.measure: Callable = measure if measure is not None else self.image_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dic: OrderedDict[tuple, Image.Image] = OrderedDict()
+
+    @staticmethod
+    def image_bytes(image: Image.Image) -> int:
+        return image.size[0] * image.size[1] * len(image.getbands())
+
+    @staticmethod
+    def photo_bytes(image: ImageTk.PhotoImage) -> int:
+        return image.width() * image.height() * 4
+
+    def get(self, key: tuple) -> Image.Image | None:
+        image = self.dic.get(key)
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.dic.move_to_end(key)
+        return image
+
+    def put(self, key: tuple, image: Image.Image):
+        if key in self.dic:
+            self.size -= self.measure(self.dic.pop(key))
+        self.dic[key] = image
+        self.size += self.measure(image)
+        self._evict()
+
+    def set_budget(self, budget: int):
+        self.budget = budget
+        self._evict()
+
+    def _evict(self):
+        """
+        budgetを超えている間、最も古い画像を破棄する
+        最後に追加した1枚は必ず残す
+        """
+        while self.size > self.budget and len(self.dic) > 1:
+            _, image = self.dic.popitem(last=False)
+            self.size -= self.measure(image)
+            self.evictions += 1
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.dic
+
+    def clear(self):
+        self.dic.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "count": len(self.dic),
+            "size": self.size,
+            "budget": self.budget
+        }
+
+
+
+class TextRenderer:
+    """
+    縁取り文字の画像を生成するクラス
+    フォントはサイズ毎に一度だけ読み込み、生成した画像は(text, color, size, stroke)毎に使い回す
+    """
+    def __init__(self, font_path: str):
+        self.font_path = font_path
+        self.fonts: dict[int, ImageFont.FreeTypeFont] = {}
+        self.dic: dict[tuple, Image.Image] = {}
+
+    def get_font(self, size: int) -> ImageFont.FreeTypeFont:
+        if not size in self.fonts:
+            self.fonts[size] = ImageFont.truetype(self.font_path, size)
+        return self.fonts[size]
+
+    def render(self, text: str, color: str, size: int, stroke: int=4) -> Image.Image:
+        """
+        文字画像を取得する
+        返り値は共有されているので加工しないこと
+        """
+        key = (text, color, size, stroke)
+        image = self.dic.get(key)
+        if image is None:
+            font = self.get_font(size)
+            _, _, right, bottom = font.getbbox(text, stroke_width=stroke)
+            image = Image.new("RGBA", (right + 10, bottom + 10))
+            draw = ImageDraw.Draw(image)
+            draw.text(
+                (5, 5),
+                text,
+                font=font,
+                fill=color,
+                stroke_width=stroke,
+                stroke_fill="black"
+            )
+            image = image.crop(image.split()[-1].getbbox())
+            self.dic[key] = image
+        return image
+
+    def prerender(self, card_size: tuple[int]):
+        """
+        HP(0~400)とカウンター(0~60)、ゾーン名の文字画像を予め生成しておく
+        """
+        for hp in range(0, 410, 10):
+            self.render(str(hp), "white", card_size[0] // 2)
+        for count in range(0, 61):
+            self.render(str(count), "white", card_size[0] // 2)
+        for name in ["Deck", "Hand", "Temp", "Trash", "Side", "Lost"]:
+            for color in ["white", "red"]:
+                self.render(name, color, card_size[0] // 3)
+
+    def clear(self):
+        self.dic.clear()
 
 
 class ImageContainer:
     def __init__(self, data: Setting) -> None:
         self.data: Setting = data
-        self.dic: dict[str, Image.Image] = {
-            "System_Card": self.create_card_image("Misc/card.png"),
-            "System_check": Image.open("Misc/check.png").convert("RGBA"),
-            "System_doku": Image.open("Misc/doku.png").convert("RGBA"),
-            "System_yakedo": Image.open("Misc/yakedo.png").convert("RGBA"),
-            "System_nemuri": Image.open("Misc/nemuri.png").convert("RGBA"),
-            "System_mahi": Image.open("Misc/mahi.png").convert("RGBA"),
-            "System_konran": Image.open("Misc/konran.png").convert("RGBA"),
+        self.original_cache = ImageCache(data.get_original_image_budget())
+        self.resize_cache = ImageCache(data.get_image_cache_budget())
+        self.card_tk_cache = ImageCache(data.get_image_cache_budget(), ImageCache.photo_bytes)
+        self.tile_cache = ImageCache(16 * 1024 * 1024, ImageCache.photo_bytes)
+        self.tile_bases: dict[tuple[int], Image.Image] = {}
+        self.pack: CardPack.CardPack = None
+        self.masks: dict[tuple[int], Image.Image] = {}
+        self.animation_size: tuple[int] = None
+        self.animations: dict[str, list[ImageTk.PhotoImage]] = {}
+        self.image_quality: str = data.image_quality
+        self.text_renderer = TextRenderer("Misc/Molot.ttf")
+        self.text_size: tuple[int] = None
+        self.icon_size: tuple[int] = None
+        self.icons: dict[str, Image.Image] = {}
+        # システム画像はself.dicに、カード画像はself.original_cacheに保持する
+        self.dic: dict[str, Image.Image] = {}
+        # システム画像は初めて使う時に読み込む
+        self.system_paths: dict[str, str] = {
+            "System_Card": "Misc/card.png",
+            "System_check": "Misc/check.png",
+            "System_doku": "Misc/doku.png",
+            "System_yakedo": "Misc/yakedo.png",
+            "System_nemuri": "Misc/nemuri.png",
+            "System_mahi": "Misc/mahi.png",
+            "System_konran": "Misc/konran.png",
+            "System_coin_head": "Misc/coin_head.png",
+            "System_coin_tail": "Misc/coin_tail.png",
+            "System_Shuffle": "Misc/Shuffle.png",
+            "System_Vstar": "Misc/Vstar.png",
+            "System_Vstar_check": "Misc/Vstar_check.png",
         }
 
     def get(self, card_id: str) -> Image.Image:
-        if not card_id in self.dic.keys():
-            if not card_id in os.listdir("Card"):
-                print(f"create ImageFile {card_id}")
-                r = requests.get(f"https://www.pokemon-card.com/card-search/details.php/card/{card_id}")
-                soup = BeautifulSoup(r.text, "html.parser")
-                name = re.findall(r'<h1 class="Heading1 mt20">(.*)</h1>', str(soup))[0]
-                category = re.findall(r'<h2 class="mt20">(.*)</h2>', str(soup))[0]
-                if category == "ワザ" or category == "特性":
-                    category = "ポケモン"
-                find_start = r'class="fit" src="'
-                find_end = r'\d*"/>'
-                image_url = re.findall(rf"{find_start}(.*){find_end}", str(soup))[0]
-                image = Image.open(
-                    io.BytesIO(requests.get(f"https://www.pokemon-card.com{image_url}").content)
-                    )
-                image = image.resize((500, 700))
-                image = image.convert("RGB")
-                os.makedirs(f"Card/{card_id}")
-                image.save(f"Card/{card_id}/{category}_{name}.jpg", quality=95)
-            print(f"Loading Image {card_id}")
-            filename = os.listdir(f"Card/{card_id}")[0]
-            self.dic[card_id] = self.create_card_image(f"Card/{card_id}/{filename}")
-        return self.dic[card_id]
+        """
+        原寸の画像を取得する
+        カード画像は上限を超えると古い順に破棄し、必要になった時にファイルから読み直す
+        """
+        if card_id in self.system_paths:
+            if not card_id in self.dic:
+                self.dic[card_id] = self.load_system_image(card_id)
+            return self.dic[card_id]
+        image = self.original_cache.get(card_id)
+        if image is None:
+            image = self.create_card_image(self.get_entry(card_id)["path"])
+            self.original_cache.put(card_id, image)
+        return image
+
+    def get_entry(self, card_id: str) -> dict:
+        """
+        カードの索引情報を取得する
+        画像が無い場合はダウンロードする
+        """
+        entry = catalog.get(card_id)
+        if entry is None:
+            download_card(card_id)
+            entry = catalog.get(card_id)
+        return entry
+
+    def load_system_image(self, key: str) -> Image.Image:
+        if key == "System_Card":
+            return self.create_card_image(self.system_paths[key])
+        return Image.open(self.system_paths[key]).convert("RGBA")
+
+    def get_resized(self, card_id: str, size: tuple[int], resample: int=Image.BICUBIC) -> Image.Image:
+        """
+        リサイズ済みの画像をキャッシュから取得する
+        返り値は共有されているので加工する場合はcopyすること
+        """
+        key = (card_id, size[0], size[1], resample)
+        image = self.resize_cache.get(key)
+        if image is None:
+            image = self.get_packed(card_id, size, resample)
+            if image is None:
+                if self.use_draft(card_id):
+                    image = self.create_card_image(self.get_entry(card_id)["path"], size, resample)
+                else:
+                    image = self.get(card_id).resize(size, resample)
+            self.resize_cache.put(key, image)
+        return image
+
+    def use_draft(self, card_id: str) -> bool:
+        """
+        JPEGを縮小展開するかどうか
+        原寸画像を既に保持している場合はそれをリサイズした方が速い
+        """
+        if self.image_quality == "quality" or card_id in self.system_paths:
+            return False
+        return not card_id in self.original_cache
+
+    def get_packed(self, card_id: str, size: tuple[int], resample: int) -> Image.Image | None:
+        """
+        パックファイル(Cache/cards.pack)があればそこからリサイズ済みの画像を取得する
+        パック作成後に画像が変わったカードやパックに無いサイズは None を返す
+        パックファイルが無い間は呼び出し毎に確認し、作成された時点で使い始める
+        """
+        if self.pack is None:
+            pack = CardPack.CardPack("Cache/cards.pack")
+            if not pack.open():
+                return None
+            self.pack = pack
+        if resample != Image.BICUBIC or card_id in self.system_paths:
+            return None
+        entry = catalog.get(card_id)
+        if entry is None:
+            return None
+        return self.pack.get(card_id, size, entry["hash"])
+
+    def get_card_tk(self, key: tuple, create: Callable) -> ImageTk.PhotoImage:
+        """
+        カードの表示状態をkeyとしてPhotoImageを共有する
+        キャッシュに無い場合はcreate関数で合成した画像から生成する
+        """
+        image_tk = self.card_tk_cache.get(key)
+        if image_tk is None:
+            image_tk = ImageTk.PhotoImage(create())
+            self.card_tk_cache.put(key, image_tk)
+        return image_tk
+
+    def memory_size(self) -> dict[str, int]:
+        """
+        各キャッシュが保持している画像のバイト数
+        """
+        return {
+            "original": self.original_cache.size,
+            "resize": self.resize_cache.size,
+            "card_tk": self.card_tk_cache.size,
+            "tile": self.tile_cache.size,
+            "system": sum(ImageCache.image_bytes(image) for image in self.dic.values())
+        }
+
+    def memory_report(self):
+        for key, size in self.memory_size().items():
+            print(f"{key:<10}{size / 1024 / 1024:8.2f} MB")
+
+    def get_icon(self, key: str) -> Image.Image:
+        """
+        現在のカードサイズに合わせたアイコン画像を取得する
+        返り値は共有されているので加工しないこと
+        """
+        if self.icon_size != self.data.get_card_size():
+            self.create_icons()
+        return self.icons[key]
+
+    def create_icons(self):
+        """
+        ステータスアイコンやコイン等のシステム画像をカードサイズに合わせて生成する
+        カードサイズが変わった時だけ作り直す
+        """
+        width, height = self.data.get_card_size()
+        icons = {}
+        for key in ["check", "doku", "yakedo", "nemuri", "mahi", "konran"]:
+            image = self.get(f"System_{key}").copy()
+            image.thumbnail((width // 3, width // 3), Image.LANCZOS)
+            icons[key] = image
+        for key in ["coin_head", "coin_tail", "Shuffle"]:
+            icons[key] = self.get(f"System_{key}").resize((width, width))
+        for key in ["Vstar", "Vstar_check"]:
+            icons[key] = self.get(f"System_{key}").resize((height, height // 2))
+        self.icons = icons
+        self.icon_size = (width, height)
+
+    def get_animation_frames(self, key: str) -> list[ImageTk.PhotoImage]:
+        """
+        アニメーション用のPhotoImageのリストを取得する
+        coin: [表, 裏]
+        shuffle: 0度から360度まで10度毎に回転した画像
+        カードサイズ毎に一度だけ生成し、全ての盤面で共有する
+        """
+        if self.animation_size != self.data.get_card_size():
+            self.animation_size = self.data.get_card_size()
+            self.animations = {}
+        if not key in self.animations:
+            if key == "coin":
+                frames = [self.get_icon("coin_head"), self.get_icon("coin_tail")]
+            elif key == "shuffle":
+                image = self.get_icon("Shuffle")
+                frames = [image.rotate(angle) for angle in range(0, 361, 10)]
+            self.animations[key] = [ImageTk.PhotoImage(frame) for frame in frames]
+        return self.animations[key]
 
     def get_tk(self, card_id, size: tuple[int]) -> ImageTk.PhotoImage:
-        image = self.get(card_id).resize(size)
+        image = self.get_resized(card_id, size)
         return ImageTk.PhotoImage(image)
 
-    def create_card_image(self, path) -> Image.Image:
+    def setting_update(self):
+        """
+        設定の読み込み、変更時に呼び出す
+        """
+        self.original_cache.set_budget(self.data.get_original_image_budget())
+        self.resize_cache.set_budget(self.data.get_image_cache_budget())
+        self.card_tk_cache.set_budget(self.data.get_image_cache_budget())
+        if self.image_quality != self.data.image_quality:
+            self.image_quality = self.data.image_quality
+            self.resize_cache.clear()
+            self.card_tk_cache.clear()
+        if self.text_size != self.data.get_card_size():
+            self.text_size = self.data.get_card_size()
+            self.text_renderer.clear()
+            self.text_renderer.prerender(self.text_size)
+
+    def create_card_image(self, path, size: tuple[int]=None, resample: int=Image.BICUBIC) -> Image.Image:
         """
         実際のカードのように四隅にα値を追加する
+        sizeを指定した場合はJPEGを縮小して展開し、sizeにリサイズしてからα値を追加する
         """
         image = Image.open(path)
-        mask = Image.open("Misc/mask.png").resize(image.size).convert('L')
-        image.putalpha(mask)
+        if size is not None:
+            if self.image_quality == "speed":
+                image.draft("RGB", size)
+                image = image.resize(size, Image.BILINEAR)
+            else:
+                image.draft("RGB", (size[0] * 2, size[1] * 2))
+                image = image.resize(size, resample)
+        image.putalpha(self.get_mask(image.size))
         return image
 
+    def get_mask(self, size: tuple[int]) -> Image.Image:
+        if not size in self.masks:
+            self.masks[size] = Image.open("Misc/mask.png").resize(size).convert('L')
+        return self.masks[size]
+
+    def get_deck_image_path(self, deck_list: list[str], size: tuple[int]) -> str:
+        """
+        デッキ画像のキャッシュファイルのパス
+        デッキリスト、画像サイズ、各カード画像のハッシュ値から名前を決める
+        """
+        key = hashlib.sha1()
+        key.update(f"{size[0]}x{size[1]}\n{self.image_quality}\n".encode())
+        for card_id in deck_list:
+            entry = catalog.get(card_id)
+            key.update(f"{card_id}:{entry['hash'] if entry is not None else ''}\n".encode())
+        return f"Cache/preview/{key.hexdigest()}.png"
+
     def create_deck_image(self, deck_list: list[str], size: tuple[int]) -> ImageTk.PhotoImage:
+        """
+        60枚のカードを12x5に並べたデッキ画像を生成する
+        生成した画像はCache/previewに保存し、同じデッキは保存した画像を使う
+        """
+        if len(deck_list) != 60:
+            return ImageTk.PhotoImage(Image.new("RGB", (size[0]*12, size[1]*5), "gray"))
+        # 未ダウンロードのカードがある場合はハッシュ値が決まらないので保存した画像を探さない
+        if all(card_id in catalog for card_id in deck_list):
+            path = self.get_deck_image_path(deck_list, size)
+            if os.path.isfile(path):
+                try:
+                    with Image.open(path) as image:
+                        image_tk = ImageTk.PhotoImage(image)
+                    os.utime(path)
+                    return image_tk
+                except OSError:
+                    print(f"デッキ画像の読み込みに失敗しました {path}")
         image = Image.new("RGB", (size[0]*12, size[1]*5), "gray")
-        if len(deck_list) == 60:
-            column = 0
-            row = 0
-            for card_id in deck_list:
-                img = self.get(card_id).resize(size)
-                image.paste(img, (size[0]*column, size[1]*row))
-                column += 1
-                if column > 11:
-                    column = 0
-                    row += 1
+        thumbnails = {card_id: self.get_resized(card_id, size) for card_id in dict.fromkeys(deck_list)}
+        for index, card_id in enumerate(deck_list):
+            row, column = divmod(index, 12)
+            image.paste(thumbnails[card_id], (size[0]*column, size[1]*row))
+        # get_resizedで全てのカードが揃ってからパスを決める
+        path = self.get_deck_image_path(deck_list, size)
+        os.makedirs("Cache/preview", exist_ok=True)
+        image.save(f"{path}.tmp", format="PNG")
+        os.replace(f"{path}.tmp", path)
+        self.prune_deck_images()
         return ImageTk.PhotoImage(image)
 
+    def prune_deck_images(self, limit: int=PREVIEW_LIMIT):
+        """
+        Cache/previewのデッキ画像を最近使ったものからlimit個だけ残す
+        """
+        with os.scandir("Cache/preview") as it:
+            entries = [entry for entry in it if entry.name.endswith(".png")]
+        if len(entries) <= limit:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[limit:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
     def create_system_image(self, text: str, length: int, color: str) -> ImageTk.PhotoImage:
-        image = self.get("System_Card").resize(self.data.get_card_size())
-        image.putalpha(200)
-        draw = ImageDraw.Draw(image)
-        draw.rectangle(
-            [
-                (0, 0),
-                (image.size[0]-1, image.size[1]-1)
-            ],
-            outline="black",
-            width=4
-        )
-        text_image = self.create_text(text, color)
-        image.paste(
-            text_image,
-            (image.size[0] // 2 - text_image.size[0] // 2, 10),
-            mask=text_image
-        )
-        length_image = self.create_text(length, "white")
-        image.paste(
-            length_image,
-            (
-                image.size[0] // 2 - length_image.size[0] // 2,
-                image.size[1] // 2 - length_image.size[1] // 2
-            ),
-            mask=length_image
-        )
-        return ImageTk.PhotoImage(image)
+        """
+        DeckやHand等のゾーンの枚数を表示する画像を取得する
+        (text, length, color, カードサイズ)毎に生成したPhotoImageを使い回す
+        """
+        key = (text, length, color, self.data.get_card_size())
+        image_tk = self.tile_cache.get(key)
+        if image_tk is None:
+            image = self._get_tile_base().copy()
+            text_image = self.create_text(text, color)
+            image.paste(
+                text_image,
+                (image.size[0] // 2 - text_image.size[0] // 2, 10),
+                mask=text_image
+            )
+            length_image = self.create_text(length, "white")
+            image.paste(
+                length_image,
+                (
+                    image.size[0] // 2 - length_image.size[0] // 2,
+                    image.size[1] // 2 - length_image.size[1] // 2
+                ),
+                mask=length_image
+            )
+            image_tk = ImageTk.PhotoImage(image)
+            self.tile_cache.put(key, image_tk)
+        return image_tk
+
+    def _get_tile_base(self) -> Image.Image:
+        """
+        ゾーン表示用の半透明で枠付きのカード裏面画像
+        """
+        size = self.data.get_card_size()
+        if not size in self.tile_bases:
+            image = self.get_resized("System_Card", size).copy()
+            image.putalpha(200)
+            draw = ImageDraw.Draw(image)
+            draw.rectangle(
+                [
+                    (0, 0),
+                    (image.size[0]-1, image.size[1]-1)
+                ],
+                outline="black",
+                width=4
+            )
+            self.tile_bases[size] = image
+        return self.tile_bases[size]
 
     def create_text(self, text: str | int, color: str) -> Image.Image:
+        """
+        縁取り文字の画像を取得する
+        文字列はカード幅の1/3、数値はカード幅の1/2のサイズで生成する
+        """
         if isinstance(text, str):
-            font = ImageFont.truetype("Misc/Molot.ttf", self.data.card_size[0] // 3)
+            size = self.data.card_size[0] // 3
         else:
-            font = ImageFont.truetype("Misc/Molot.ttf", self.data.card_size[0] // 2)
-        image = Image.new("RGBA", (300, 300))
-        draw = ImageDraw.Draw(image)
-        draw.text(
-            (5, 5),
-            str(text),
-            font=font,
-            fill=color,
-            stroke_width=4,
-            stroke_fill="black"
-        )
-        return image.crop(image.split()[-1].getbbox())
+            size = self.data.card_size[0] // 2
+        return self.text_renderer.render(str(text), color, size)
 
-def card_data_check():
+def card_data_check(full_check: bool=False):
+    """
+    Cardフォルダの適合性確認
+    前回の確認から更新されたカードフォルダだけを確認する
+    full_checkがTrueの場合は全てのカードフォルダを確認する
+    """
     if not os.path.isdir("Card"):
         os.makedirs("Card")
     if not os.path.isdir("Deck"):
         os.makedirs("Deck")
     print("Cradフォルダの適合性確認")
-    data_list = os.listdir("Card")
-    count = 0
-    for data in data_list:
+    manifest = Catalog.CardManifest("Card")
+    if not full_check:
+        manifest.load()
+    changed, removed = manifest.changed_entries(full_check)
+    for card_id in removed:
+        manifest.remove(card_id)
+        catalog.remove(card_id)
+    for entry in changed:
+        data = entry.name
         check = os.listdir(f"Card/{data}")
-        if len(check) != 1:
+        if len(check) != 1 or data.endswith(".part"):
             for c in check:
                 os.remove(f"Card/{data}/{c}")
             os.rmdir(f"Card/{data}")
-        count += 1
-        print(f"{count} / {len(data_list)}")
+            manifest.remove(data)
+            catalog.remove(data)
+        else:
+            if full_check or data in manifest.dic:
+                # 中身が差し替わっている可能性があるので、次に使う時に索引を作り直す
+                # 記録の無いフォルダはダウンロードしたばかりなので索引をそのまま使う
+                catalog.remove(data)
+            manifest.update(data, entry.stat().st_mtime_ns, len(check))
+    if changed or removed or full_check:
+        manifest.save()
+    catalog.save()
+    print(f"確認したフォルダ: {len(changed)}\t削除されたフォルダ: {len(removed)}")
+
+_download_lock = threading.Lock()
+_download_locks: dict[str, threading.Lock] = {}
+
+def download_card(card_id: str) -> bool:
+    """
+    カード画像が無ければ公式サイトからダウンロードしてCardフォルダに保存する
+    同じカードを複数スレッドから同時にダウンロードしないようにカード毎にロックする
+    ダウンロードした場合にTrueを返す
+    """
+    with _download_lock:
+        lock = _download_locks.setdefault(card_id, threading.Lock())
+    with lock:
+        if card_id in catalog:
+            return False
+        print(f"create ImageFile {card_id}")
+        r = Network.client.get(f"/card-search/details.php/card/{card_id}")
+        name, category, image_url = PageParser.parse_card_detail(r.content)
+        if category == "ワザ" or category == "特性":
+            category = "ポケモン"
+        image = Image.open(
+            io.BytesIO(Network.client.get(image_url).content)
+            )
+        image = image.resize((500, 700))
+        image = image.convert("RGB")
+        # 書き込み途中のファイルが残らないように一時フォルダに保存してから移動する
+        os.makedirs(f"Card/{card_id}.part", exist_ok=True)
+        image.save(f"Card/{card_id}.part/{category}_{name}.jpg", quality=95)
+        os.replace(f"Card/{card_id}.part", f"Card/{card_id}")
+        catalog.add(card_id, f"Card/{card_id}/{category}_{name}.jpg", category, name)
+        return True
+
+
+class CardPrefetcher:
+    """
+    デッキのカード画像をバックグラウンドで並列にダウンロードする
+    ゲーム開始時に画像がCardフォルダに揃っているようにデッキ読み込み直後に開始する
+    """
+    def __init__(self, card_ids: list[str], workers: int=8, progress: Callable=None):
+        self.card_ids: list[str] = list(dict.fromkeys(card_ids))
+        self.workers = workers
+        self.progress: Callable = progress if progress is not None else self._print_progress
+        self.count = 0
+        self.errors: list[str] = []
+        self.cancel_event = threading.Event()
+        self.executor: ThreadPoolExecutor = None
+        self.futures = []
+        self._lock = threading.Lock()
+
+    def _print_progress(self, count: int, total: int, card_id: str):
+        print(f"Prefetch_CardImage: {count} / {total}\t{card_id}")
+
+    def start(self):
+        targets = [card_id for card_id in self.card_ids if not card_id in catalog]
+        with self._lock:
+            self.count = len(self.card_ids) - len(targets)
+        if not targets:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = [self.executor.submit(self._fetch, card_id) for card_id in targets]
+        self.executor.shutdown(wait=False)
+
+    def _fetch(self, card_id: str):
+        if self.cancel_event.is_set():
+            return
+        try:
+            download_card(card_id)
+        except Exception as e:
+            print(f"Prefetch error {card_id}: {e}")
+            with self._lock:
+                self.errors.append(card_id)
+        with self._lock:
+            self.count += 1
+            count = self.count
+        if count == len(self.card_ids):
+            catalog.save()
+        self.progress(count, len(self.card_ids), card_id)
+
+    def cancel(self):
+        """
+        未開始のダウンロードを取り消す
+        実行中のダウンロードは完了まで待たない
+        """
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+
+    def wait(self):
+        for future in self.futures:
+            if not future.cancelled():
+                future.result()
+
+    def is_done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+
+class DeckCodeCache:
+    """
+    デッキコードから取得したカードIDのリストを取得日時と一緒に保存する
+    一度読み込んだデッキコードは通信せずにカードIDを取得できる
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.dic: dict[str, dict] = None
+
+    def _get_dic(self) -> dict[str, dict]:
+        if self.dic is None:
+            self.dic = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self.dic = json.load(f)
+                except (OSError, ValueError):
+                    print("デッキコードのキャッシュの読み込みに失敗しました")
+        return self.dic
+
+    def get(self, deck_id: str, max_age: float=None) -> list[str] | None:
+        """
+        保存済みのカードIDのリストを取得する
+        max_ageを指定した場合、取得してからmax_age秒以上経過していれば None を返す
+        """
+        entry = self._get_dic().get(deck_id)
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry["fetched"] > max_age:
+            return None
+        return list(entry["ids"])
+
+    def add(self, deck_id: str, card_list: list[str]):
+        self._get_dic()[deck_id] = {"ids": card_list, "fetched": time.time()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.dic, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
 
-def create_deckid_list(deck_id: str) -> list[str]:
+def create_deckid_list(deck_id: str, revalidate: bool=False, max_age: float=None) -> list[str]:
     """
     ポケモンカード公式デッキIDからカードのIDを60枚分出力する
+    保存済みのデッキコードは通信せずに返す
+    revalidateがTrue、または保存してからmax_age秒以上経過している場合は再取得する
+    通信に失敗した場合は保存済みのリストがあればそれを返す
     """
-    r = requests.get(f"https://www.pokemon-card.com/deck/result.html/deckID/{deck_id}/")
-    soup = BeautifulSoup(r.text,"html.parser")
-    find_start = r'"deck_.*" type="hidden" value="'
-    find_end = r'\d*">'
-    card_list = []
-    for c in re.findall(rf'{find_start}(.*){find_end}',str(soup)):
-        if c and isinstance(c, str):
-            for data in c.split("-"):
-                card_id, length, _ = map(str, data.split("_"))
-                for _ in range(int(length)):
-                    card_list.append(card_id)
+    if not revalidate:
+        card_list = deck_code_cache.get(deck_id, max_age)
+        if card_list is not None:
+            return card_list
+    try:
+        r = Network.client.get(f"/deck/result.html/deckID/{deck_id}/")
+    except (Network.HttpError, Network.TransportError) as e:
+        print(f"デッキコードの取得に失敗しました: {e}")
+        return deck_code_cache.get(deck_id) or []
+    card_list = PageParser.parse_deck_ids(r.content)
     if len(card_list) == 60:
+        deck_code_cache.add(deck_id, card_list)
         return card_list
     else:
         return []
@@ -305,4 +905,6 @@ def get_reverse_color(color: str):
 
 
 data = Setting()
+catalog = Catalog.CardCatalog("Card")
+deck_code_cache = DeckCodeCache("Cache/deck_codes.json")
 container = ImageContainer(data)
\ No newline at end of file